@@ -0,0 +1,139 @@
+"""
+Throughput and tail latency of the client transport against fake_server.py.
+
+Drives the same pieces Client is built from (MessageWriter, ProcessReader,
+HandlerRegistry) without Sublime:
+
+  * completion: many pipelined completion requests with large result lists,
+    reporting requests/sec and p50/p95/p99 latency
+  * sync: didChange of a large document, each answered by a diagnostics
+    storm, reporting changes/sec and diagnostics/sec
+
+    python3 benchmarks/bench_client.py [--requests N] [--completion-items N] ...
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import dxlib
+from dxmate_lib.framing import encode_payload, loads
+from dxmate_lib.handlers import HandlerRegistry
+from dxmate_lib.transport import MessageWriter, ProcessReader
+
+FAKE_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_server.py")
+URI = "file:///project/classes/Big.cls"
+
+
+class Harness(object):
+
+    def __init__(self, server_args):
+        self.process = subprocess.Popen(
+            [sys.executable, FAKE_SERVER] + server_args,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.writer = MessageWriter(self.process.stdin)
+        self.handlers = HandlerRegistry()
+        self.request_id = 0
+        self.diagnostics = 0
+        self.done = threading.Condition()
+        self.reader = ProcessReader(self.process.stdout, self.process.stderr,
+                                    self.on_message, lambda: None)
+        self.reader.start()
+
+    def send(self, message):
+        self.writer.send(*encode_payload(message))
+
+    def request(self, method, params, handler=None):
+        self.request_id += 1
+        self.handlers.add(self.request_id, method, handler)
+        self.send({"jsonrpc": "2.0", "id": self.request_id, "method": method, "params": params})
+
+    def on_message(self, body):
+        message = loads(body)
+        if "id" in message:
+            pending = self.handlers.pop(int(message["id"]))
+            if pending and pending.handler:
+                pending.handler(message.get("result"))
+        elif message.get("method") == "textDocument/publishDiagnostics":
+            self.diagnostics += 1
+        with self.done:
+            self.done.notify_all()
+
+    def wait_for(self, condition, timeout=60):
+        with self.done:
+            return self.done.wait_for(condition, timeout)
+
+    def close(self):
+        self.send({"jsonrpc": "2.0", "method": "exit"})
+        self.writer.close()
+        self.process.wait()
+
+
+def bench_completion(harness, count, concurrency):
+    position = {"textDocument": {"uri": URI}, "position": {"line": 10, "character": 4}}
+    remaining = [count]
+
+    def send_next(result=None):
+        if remaining[0] > 0:
+            remaining[0] -= 1
+            harness.request("textDocument/completion", position, send_next)
+
+    start = time.perf_counter()
+    for _ in range(min(concurrency, count)):
+        send_next()
+    harness.wait_for(lambda: remaining[0] == 0 and len(harness.handlers) == 0)
+    elapsed = time.perf_counter() - start
+    stats = harness.handlers.latency_stats()["textDocument/completion"]
+    print("completion: {} requests ({} in flight) in {:.2f}s, {:.0f} requests/sec, {:.1f} MB in".format(
+        count, concurrency, elapsed, count / elapsed, harness.reader.bytes_read / 1e6))
+    print("            latency p50 {p50_ms:.0f} ms, p95 {p95_ms:.0f} ms, "
+          "p99 {p99_ms:.0f} ms, max {max_ms:.0f} ms".format(**stats))
+
+
+def bench_sync(harness, changes, lines, storm):
+    text = "".join("    Integer value{0} = {0};\n".format(n) for n in range(lines))
+    received = harness.diagnostics
+    start = time.perf_counter()
+    for version in range(1, changes + 1):
+        harness.send({"jsonrpc": "2.0", "method": "textDocument/didChange", "params": {
+            "textDocument": {"uri": URI, "version": version},
+            "contentChanges": [{"text": text}]}})
+    expected = received + changes * storm
+    harness.wait_for(lambda: harness.diagnostics >= expected)
+    elapsed = time.perf_counter() - start
+    print("sync:       {} didChange of {:.0f} KB in {:.2f}s, {:.0f} changes/sec, "
+          "{:.0f} diagnostics/sec".format(changes, len(text) / 1024, elapsed,
+                                          changes / elapsed, (harness.diagnostics - received) / elapsed))
+    print("            writer: {}".format(json.dumps(harness.writer.stats(), sort_keys=True)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="completion requests kept in flight")
+    parser.add_argument("--completion-items", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=5)
+    parser.add_argument("--jitter", type=float, default=5)
+    parser.add_argument("--changes", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--diagnostic-storm", type=int, default=5)
+    args = parser.parse_args()
+
+    harness = Harness([
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--completion-items", str(args.completion_items),
+        "--diagnostic-storm", str(args.diagnostic_storm)])
+    try:
+        bench_completion(harness, args.requests, args.concurrency)
+        bench_sync(harness, args.changes, args.lines, args.diagnostic_storm)
+    finally:
+        harness.close()
+
+
+if __name__ == '__main__':
+    main()
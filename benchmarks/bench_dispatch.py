@@ -0,0 +1,90 @@
+"""
+Benchmark for classifying inbound frames during an indexing burst.
+
+Compares parsing every frame with the json module (the previous
+behaviour) against the dispatcher's fast path: classify with
+peek_id/peek_method, drop window/logMessage unparsed and parse the rest
+with framing.loads (orjson or ujson when importable).
+
+By default the burst is synthesized to look like apex-jorje indexing
+output: mostly logMessage notifications with some diagnostics and
+responses mixed in. Pass a recording (see the record_traffic_path
+setting) to use the inbound frames of a real session instead.
+
+    python3 benchmarks/bench_dispatch.py [frames | recording]
+"""
+
+import json
+import os
+import sys
+import time
+
+import dxlib
+from dxmate_lib.framing import peek_id, peek_method, loads, fast_json
+from dxmate_lib.recorder import read_recording, INBOUND
+
+SKIPPED = ("window/logMessage", "telemetry/event")
+
+
+def indexing_burst(count):
+    frames = []
+    for i in range(count):
+        if i % 50 == 0:
+            message = {"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics", "params": {
+                "uri": "file:///project/classes/Class{}.cls".format(i),
+                "diagnostics": [{"range": {"start": {"line": n, "character": 0},
+                                           "end": {"line": n, "character": 8}},
+                                 "severity": 2, "message": "Unused variable {}".format(n)}
+                                for n in range(5)]}}
+        elif i % 50 == 1:
+            message = {"jsonrpc": "2.0", "id": i, "result": [
+                {"label": "field{}".format(n), "kind": 5} for n in range(50)]}
+        else:
+            message = {"jsonrpc": "2.0", "method": "window/logMessage", "params": {
+                "type": 4, "message": "Indexing force-app/main/default/classes/Class{}.cls "
+                                      "- resolved {} symbols in {} ms".format(i, i % 97, i % 13)}}
+        frames.append(json.dumps(message).encode("UTF-8"))
+    return frames
+
+
+def parse_all(frames):
+    handled = 0
+    for frame in frames:
+        payload = json.loads(frame.decode("UTF-8"))
+        if payload.get("method") not in SKIPPED:
+            handled += 1
+    return handled
+
+
+def fast_path(frames):
+    handled = 0
+    for frame in frames:
+        if peek_method(frame) in SKIPPED:
+            continue
+        peek_id(frame)
+        loads(frame)
+        handled += 1
+    return handled
+
+
+def recorded_burst(path):
+    return [body for timestamp, direction, body in read_recording(path)
+            if direction == INBOUND]
+
+
+def run(frames):
+    count = len(frames)
+    size = sum(len(frame) for frame in frames)
+    print("{} frames, {:.1f} MB, fast json backend: {}".format(
+        count, size / 1e6, fast_json.__name__ if fast_json else "none"))
+    for name, fn in (("parse all", parse_all), ("fast path", fast_path)):
+        start = time.perf_counter()
+        handled = fn(frames)
+        elapsed = time.perf_counter() - start
+        print("{:>10}: {:7.1f} ms, {:8.0f} frames/sec ({} dispatched)".format(
+            name, elapsed * 1000, count / elapsed, handled))
+
+
+if __name__ == '__main__':
+    arg = sys.argv[1] if len(sys.argv) > 1 else "50000"
+    run(recorded_burst(arg) if os.path.isfile(arg) else indexing_burst(int(arg)))
@@ -0,0 +1,70 @@
+"""
+Throughput benchmark for lib/framing.FrameReader.
+
+Writes a stream of diagnostics and completion frames into a pipe from a
+separate thread and measures how fast FrameReader can cut them back into
+messages.
+
+    python3 benchmarks/bench_framing.py [messages]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import dxlib
+from dxmate_lib.framing import FrameReader, encode_frame
+
+
+def diagnostics_frame(i):
+    return encode_frame(json.dumps({
+        "jsonrpc": "2.0",
+        "method": "textDocument/publishDiagnostics",
+        "params": {
+            "uri": "file:///project/force-app/main/default/classes/Class{}.cls".format(i),
+            "diagnostics": [{
+                "range": {"start": {"line": n, "character": 4}, "end": {"line": n, "character": 20}},
+                "severity": 1,
+                "message": "Variable does not exist: accountId{}".format(n)
+            } for n in range(10)]
+        }
+    }).encode("UTF-8"))
+
+
+def completion_frame(i):
+    return encode_frame(json.dumps({
+        "jsonrpc": "2.0",
+        "id": i,
+        "result": [{"label": "method{}".format(n), "kind": 2} for n in range(500)]
+    }).encode("UTF-8"))
+
+
+def run(count):
+    frames = [diagnostics_frame(i) if i % 4 else completion_frame(i) for i in range(64)]
+    read_fd, write_fd = os.pipe()
+    total_bytes = sum(len(frames[i % len(frames)]) for i in range(count))
+
+    def write():
+        with os.fdopen(write_fd, 'wb') as pipe:
+            for i in range(count):
+                pipe.write(frames[i % len(frames)])
+
+    received = []
+    reader = FrameReader()
+    writer = threading.Thread(target=write)
+    start = time.perf_counter()
+    writer.start()
+    reader.read_from(read_fd, received.append)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    os.close(read_fd)
+
+    assert len(received) == count, (len(received), count)
+    print("{} messages, {:.1f} MB in {:.3f}s".format(count, total_bytes / 1e6, elapsed))
+    print("{:.0f} messages/sec, {:.1f} MB/sec".format(count / elapsed, total_bytes / 1e6 / elapsed))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
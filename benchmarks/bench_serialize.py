@@ -0,0 +1,50 @@
+"""
+Microbenchmark for lib/framing.encode_payload on large didChange bodies.
+
+Compares the single-encode path against the previous one, which built
+the whole frame as a str and encoded it to UTF-8 afterwards.
+
+    python3 benchmarks/bench_serialize.py [lines]
+"""
+
+import json
+import sys
+import timeit
+from collections import OrderedDict
+
+import dxlib
+from dxmate_lib.framing import encode_payload
+
+APEX_LINE = "        Account acc = [SELECT Id, Name FROM Account WHERE Name = 'Café {}' LIMIT 1];\n"
+
+
+def did_change(lines):
+    r = OrderedDict()
+    r["jsonrpc"] = "2.0"
+    r["method"] = "textDocument/didChange"
+    r["params"] = {
+        "textDocument": {"uri": "file:///project/classes/Big.trigger", "version": 42},
+        "contentChanges": [{"text": "".join(APEX_LINE.format(i) for i in range(lines))}]
+    }
+    return r
+
+
+def previous_format(payload):
+    content = json.dumps(payload, sort_keys=False)
+    message = "Content-Length: {}\r\n\r\n{}".format(len(content), content)
+    return bytes(message, 'UTF-8')
+
+
+def run(lines):
+    payload = did_change(lines)
+    header, body = encode_payload(payload)
+    print("didChange with {} lines: {:.0f} KB body".format(lines, len(body) / 1024))
+    for name, fn in (("previous", previous_format), ("encode_payload", encode_payload)):
+        number = 50
+        best = min(timeit.repeat(lambda: fn(payload), number=number, repeat=5)) / number
+        print("{:>15}: {:8.3f} ms/message, {:7.1f} MB/sec".format(
+            name, best * 1000, len(body) / 1e6 / best))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
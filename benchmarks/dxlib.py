@@ -0,0 +1,18 @@
+"""
+Makes the sublime-free modules in lib/ importable outside of Sublime.
+
+lib/__init__.py pulls in modules that need the sublime API, so lib is
+registered here as a bare package and its submodules are imported from
+that, e.g. `from dxlib import framing`.
+"""
+
+import os
+import sys
+import types
+
+LIB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib')
+
+if 'dxmate_lib' not in sys.modules:
+    package = types.ModuleType('dxmate_lib')
+    package.__path__ = [LIB_PATH]
+    sys.modules['dxmate_lib'] = package
@@ -0,0 +1,165 @@
+"""
+Scriptable stand-in for the apex-jorje language server.
+
+Speaks LSP over stdio with the same framing as the real server, so the
+client stack can be load tested without Java:
+
+    "server_command": ["python3", "${plugin_folder}/benchmarks/fake_server.py",
+                       "--latency", "50", "--completion-items", "5000"]
+
+Requests are answered after --latency (+/- --jitter) milliseconds on their
+own thread, cancelled requests get a RequestCancelled error, and every
+didOpen/didChange triggers a burst of diagnostics and log messages.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import dxlib
+from dxmate_lib.framing import FrameReader, encode_frame
+
+REQUEST_CANCELLED = -32800
+METHOD_NOT_FOUND = -32601
+
+
+class FakeServer(object):
+
+    def __init__(self, options):
+        self.options = options
+        self.output = sys.stdout.buffer
+        self.lock = threading.Lock()
+        self.cancelled = set()
+        self.requests = 0
+
+    def write(self, message):
+        body = json.dumps(message).encode("UTF-8")
+        with self.lock:
+            self.output.write(encode_frame(body))
+            self.output.flush()
+
+    def notify(self, method, params):
+        self.write({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def delay(self):
+        latency = self.options.latency + random.uniform(-1, 1) * self.options.jitter
+        if latency > 0:
+            time.sleep(latency / 1000.0)
+
+    def on_message(self, body):
+        message = json.loads(body.decode("UTF-8"))
+        method = message.get("method")
+        if "id" in message and method:
+            self.requests += 1
+            if self.options.crash_after and self.requests > self.options.crash_after:
+                sys.stderr.write("fake server: crashing after {} requests\n".format(
+                    self.options.crash_after))
+                sys.stderr.flush()
+                os._exit(self.options.crash_exit_code)
+            threading.Thread(target=self.respond, args=(message,), daemon=True).start()
+        elif method == "$/cancelRequest":
+            self.cancelled.add(message["params"]["id"])
+        elif method in ("textDocument/didOpen", "textDocument/didChange"):
+            self.publish(message["params"]["textDocument"]["uri"])
+        elif method == "exit":
+            os._exit(0)
+
+    def respond(self, request):
+        self.delay()
+        request_id = request["id"]
+        if request_id in self.cancelled:
+            self.cancelled.discard(request_id)
+            self.write({"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": REQUEST_CANCELLED, "message": "cancelled"}})
+            return
+        handler = getattr(self, "handle_" + request["method"].split("/")[-1], None)
+        if handler is None:
+            self.write({"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": METHOD_NOT_FOUND, "message": request["method"]}})
+            return
+        self.write({"jsonrpc": "2.0", "id": request_id, "result": handler(request.get("params"))})
+
+    def publish(self, uri):
+        for n in range(self.options.log_messages):
+            self.notify("window/logMessage", {"type": 4, "message": "Indexed {} ({})".format(uri, n)})
+        for n in range(self.options.diagnostic_storm):
+            self.notify("textDocument/publishDiagnostics", {
+                "uri": uri,
+                "diagnostics": [{
+                    "range": {"start": {"line": line, "character": 0},
+                              "end": {"line": line, "character": 10}},
+                    "severity": 1 + line % 3,
+                    "source": "apex",
+                    "message": "Fake problem {} in pass {}".format(line, n)
+                } for line in range(self.options.diagnostics)]
+            })
+
+    def handle_initialize(self, params):
+        return {"capabilities": {
+            "textDocumentSync": self.options.sync_kind,
+            "completionProvider": {"resolveProvider": False, "triggerCharacters": ["."]},
+            "hoverProvider": True,
+            "signatureHelpProvider": {"triggerCharacters": ["(", ","]},
+            "definitionProvider": True,
+            "documentSymbolProvider": True
+        }}
+
+    def handle_shutdown(self, params):
+        return None
+
+    def handle_completion(self, params):
+        return {"isIncomplete": False, "items": [{
+            "label": "fakeMethod{}".format(n),
+            "kind": 2,
+            "detail": "String fakeMethod{}(Integer)".format(n),
+            "insertText": "fakeMethod{}".format(n)
+        } for n in range(self.options.completion_items)]}
+
+    def handle_hover(self, params):
+        return {"contents": {"kind": "markdown",
+                             "value": "```apex\nString fakeSymbol\n```\n" + "Doc text. " * 20}}
+
+    def handle_signatureHelp(self, params):
+        return {"signatures": [{"label": "fakeMethod(Integer a, String b)", "parameters": [
+            {"label": "Integer a"}, {"label": "String b"}]}], "activeSignature": 0, "activeParameter": 0}
+
+    def handle_definition(self, params):
+        return [{"uri": params["textDocument"]["uri"],
+                 "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 5}}}]
+
+    def handle_documentSymbol(self, params):
+        return [{"name": "fakeSymbol{}".format(n), "kind": 6,
+                 "location": {"uri": params["textDocument"]["uri"],
+                              "range": {"start": {"line": n, "character": 0},
+                                        "end": {"line": n, "character": 10}}}}
+                for n in range(50)]
+
+    def run(self):
+        FrameReader().read_from(sys.stdin.fileno(), self.on_message)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=20, help="response time in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="random +/- ms added to latency")
+    parser.add_argument("--completion-items", type=int, default=100)
+    parser.add_argument("--diagnostics", type=int, default=5,
+                        help="diagnostics per publishDiagnostics")
+    parser.add_argument("--diagnostic-storm", type=int, default=1,
+                        help="publishDiagnostics sent per didOpen/didChange")
+    parser.add_argument("--log-messages", type=int, default=0,
+                        help="window/logMessage sent per didOpen/didChange")
+    parser.add_argument("--sync-kind", type=int, default=1, choices=(0, 1, 2),
+                        help="textDocumentSync kind to advertise")
+    parser.add_argument("--crash-after", type=int, default=0,
+                        help="exit abruptly when this many requests have been received")
+    parser.add_argument("--crash-exit-code", type=int, default=137)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    FakeServer(parse_args()).run()
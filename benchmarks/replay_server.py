@@ -0,0 +1,106 @@
+"""
+Stand-in language server that replays a recording made with the
+record_traffic_path setting.
+
+Notifications and requests the server sent are written to stdout on the
+recorded timeline, scaled by --speed. Requests coming in on stdin are
+answered with the next recorded response for the same method (with the id
+rewritten) after the recorded response time, so DXMate can be driven
+through a session without Java or a Salesforce org:
+
+    "server_command": ["python3", "${plugin_folder}/benchmarks/replay_server.py",
+                       "<recording>", "--speed", "10"]
+
+With --speed 0 everything is sent as fast as possible.
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+import dxlib
+from dxmate_lib.framing import FrameReader, encode_frame
+from dxmate_lib.recorder import read_recording, INBOUND, OUTBOUND
+
+
+class Replay(object):
+
+    def __init__(self, records, speed):
+        self.speed = speed
+        self.start = records[0][0] if records else 0
+        self.timeline = []
+        self.responses = collections.defaultdict(collections.deque)
+        self.output = sys.stdout.buffer
+        self.lock = threading.Lock()
+        self.load(records)
+
+    def load(self, records):
+        sent_requests = {}
+        for timestamp, direction, body in records:
+            message = json.loads(body.decode("UTF-8"))
+            if direction == OUTBOUND:
+                if "id" in message and "method" in message:
+                    sent_requests[message["id"]] = (message["method"], timestamp)
+            elif "method" in message:
+                self.timeline.append((timestamp - self.start, body))
+            elif message.get("id") is not None:
+                method, sent = sent_requests.pop(int(message["id"]), (None, timestamp))
+                if method:
+                    self.responses[method].append((timestamp - sent, message))
+
+    def scaled(self, seconds):
+        return seconds / self.speed if self.speed else 0
+
+    def write(self, body):
+        with self.lock:
+            self.output.write(encode_frame(body))
+            self.output.flush()
+
+    def play_timeline(self):
+        started = time.time()
+        for offset, body in self.timeline:
+            delay = started + self.scaled(offset) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.write(body)
+
+    def respond(self, request):
+        recorded = self.responses.get(request.get("method"))
+        if recorded:
+            latency, response = recorded.popleft()
+            recorded.append((latency, response))
+        else:
+            latency, response = 0, {"jsonrpc": "2.0", "result": None}
+        response = dict(response, id=request["id"])
+        delay = self.scaled(latency)
+        if delay > 0:
+            time.sleep(delay)
+        self.write(json.dumps(response).encode("UTF-8"))
+
+    def on_message(self, body):
+        message = json.loads(body.decode("UTF-8"))
+        if message.get("method") == "exit":
+            os._exit(0)
+        if "id" in message and "method" in message:
+            threading.Thread(target=self.respond, args=(message,), daemon=True).start()
+
+    def run(self):
+        threading.Thread(target=self.play_timeline, daemon=True).start()
+        FrameReader().read_from(sys.stdin.fileno(), self.on_message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed factor, 0 for no delays")
+    args = parser.parse_args()
+    Replay(list(read_recording(args.recording)), args.speed).run()
+
+
+if __name__ == '__main__':
+    main()
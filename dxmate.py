@@ -12,7 +12,13 @@ from .lib.printer import PanelPrinter
 from .lib.threads import ThreadProgress
 from .lib.threads import PanelThreadProgress
 from .lib.languageServer import *
+from .lib import languageServer
 from .lib.event_hub import EventHub
+from .lib.metrics import format_client_stats
+from .lib.completion_ranking import Memo, rank
+from .lib.completion_cache import item_text
+from .lib.apex_index import qualifier_before
+from .lib.hover import hover_cache, popup_cache
 from .lib.util import util
 from .lib.diagnostic import *
 import ntpath
@@ -57,6 +63,10 @@ def format_symbol_kind(kind):
     return symbol_kind_names.get(kind, str(kind))
 
 
+def completion_memo_key(item):
+    return (item.get("label"), item.get("kind"), item.get("insertText"), item.get("insertTextFormat"))
+
+
 def format_symbol(item):
     """
     items may be a list of strings, or a list of string lists.
@@ -111,28 +121,26 @@ class WriteOperationStatus(sublime_plugin.TextCommand):
     def description(self):
         return
 
-# not ready for code completion yet
-lsClient = None
 printer = None
 
 
 
 def plugin_loaded():
-    global lsClient
     global printer
-    if util.dxProjectFolder() != '':
-        lsClient = start_client()
-        if lsClient is None:
-            util.debug('Unable start langauge server')
-        EventHub.subscribe('on_load_async', set_syntax)
+    EventHub.subscribe('project.detected',
+                       lambda folder: EventHub.subscribe('on_load_async', set_syntax))
+    begin_startup()
     active_window_id = sublime.active_window().id()
     printer = PanelPrinter.get(active_window_id)
     printer.write("sfdx plugin loaded", erase=True)
 
 
 def plugin_unloaded():
-    if lsClient:
-        lsClient.kill()
+    client = get_client()
+    if client:
+        # server_initialized is read from the module, the star import's copy is stale
+        client.shutdown(on_shutdown=languageServer.saveApexDbFingerprint
+                        if languageServer.server_initialized else None)
 
 
 def set_syntax(view):
@@ -143,6 +151,18 @@ def set_syntax(view):
         else:
             view.set_syntax_file(os.path.join("Packages/"+util.plugin_name()+"/sublime/lang/Apex.sublime-syntax"))
 
+if hasattr(sublime_plugin, 'TextChangeListener'):
+    class TextChangeHandler(sublime_plugin.TextChangeListener):
+        """Forwards each buffer's edits for incremental document sync (Sublime Text 4 only)"""
+
+        @classmethod
+        def is_applicable(cls, buffer):
+            return True
+
+        def on_text_changed(self, changes):
+            EventHub.publish('on_text_changed', self.buffer, changes)
+
+
 class ExitHandler(sublime_plugin.EventListener):
 
     def on_window_commad(self, window, command_name, args):
@@ -155,6 +175,8 @@ class EventHandlers(sublime_plugin.EventListener):
     def __init__(self):
         self.completions = []  # type: List[Tuple[str, str]]
         self.refreshing = False
+        self.completion_flags = 0
+        self.formatted_completions = Memo(self.format_completion, completion_memo_key)
 
     def on_pre_close(self, view):
         EventHub.publish('on_pre_close', view)
@@ -198,26 +220,76 @@ class EventHandlers(sublime_plugin.EventListener):
             return None
 
         if not self.refreshing:
-            client = lsClient
-
-            if not client:
-                return
-
-            completionProvider = client.get_capability('completionProvider')
+            stdlib_items = self.stdlib_completions(view, locations[0] - len(prefix))
+            client = get_client()
+            completionProvider = client.get_capability('completionProvider') if client else None
             if not completionProvider:
-                return
-
-            autocomplete_triggers = completionProvider.get('triggerCharacters')
-            if locations[0] > 0:
-                self.completions = []
-            purge_did_change(view.buffer_id())
-            client.send_request(
-                Request.complete(
-                    util.get_document_position(view, locations[0])),
-                self.handle_response)
+                # No server (yet): the offline index is all there is
+                if not stdlib_items:
+                    return
+                self.completions = self.present_completions(stdlib_items, prefix)
+                return self.completions, (sublime.INHIBIT_WORD_COMPLETIONS
+                                          | sublime.INHIBIT_EXPLICIT_COMPLETIONS
+                                          | self.completion_flags)
+
+            autocomplete_triggers = completionProvider.get('triggerCharacters') or []
+            key = self.completion_key(view, prefix, locations[0], autocomplete_triggers)
+            items = completion_cache.get(key, prefix)
+            if items is not None:
+                self.completions = self.present_completions(items, prefix)
+            else:
+                if stdlib_items:
+                    self.completions = self.present_completions(stdlib_items, prefix)
+                elif locations[0] > 0:
+                    self.completions = []
+                send_document_request(
+                    view,
+                    Request.complete(
+                        util.get_document_position(view, locations[0])),
+                    lambda response: self.handle_response(response, key, prefix, stdlib_items))
         self.refreshing = False
         return self.completions, (sublime.INHIBIT_WORD_COMPLETIONS
-                                  | sublime.INHIBIT_EXPLICIT_COMPLETIONS)
+                                  | sublime.INHIBIT_EXPLICIT_COMPLETIONS
+                                  | self.completion_flags)
+
+    def present_completions(self, items, prefix):
+        """Formats the best completion_limit items for prefix, best first.
+
+        When items were left out Sublime is asked to query again as the
+        user types (Sublime Text 4), which is answered from the cache.
+        """
+        limit = util.get_setting('completion_limit') or 0
+        ranked = rank(items, prefix, limit, item_text)
+        capped = limit and len(items) > limit and len(ranked) == limit
+        self.completion_flags = getattr(sublime, 'DYNAMIC_COMPLETIONS', 0) if capped else 0
+        return [self.formatted_completions(item) for item in ranked]
+
+    def stdlib_completions(self, view, anchor):
+        """Completions from the offline index of standard Apex classes.
+
+        After a standard class or namespace and a '.' these are its static
+        members, otherwise the top-level standard names. They are shown
+        until the server answers and then merged with its results, which
+        add what only the org has, e.g. its SObjects under `Schema.`.
+        """
+        index = get_stdlib_index()
+        if not index:
+            return []
+        qualifier = qualifier_before(view.substr(sublime.Region(view.line(anchor).a, anchor)))
+        if qualifier:
+            container = index.resolve(qualifier)
+            if container is None:
+                return []
+            return [symbol.completion_item() for symbol in index.members(container, static_only=True)]
+        return [symbol.completion_item() for symbol in index.members('')]
+
+    def completion_key(self, view, prefix, point, triggers):
+        """Document, line and text on it before the word being completed, and the trigger before it"""
+        anchor = point - len(prefix)
+        trigger = view.substr(anchor - 1) if anchor > 0 else ''
+        line_start = view.line(anchor).a
+        return (view.file_name(), view.rowcol(anchor)[0], view.substr(sublime.Region(line_start, anchor)),
+                trigger if trigger in triggers else '')
 
     def format_completion(self, item) -> 'Tuple[str, str]':
         label = item.get("label")
@@ -232,12 +304,19 @@ class EventHandlers(sublime_plugin.EventListener):
             insertText = '\$' + insertText[1:]
         return ("{}\t{}".format(label, detail), insertText)
 
-    def handle_response(self, response):
-        self.completions = []
-        items = response["items"] if isinstance(response,
-                                                dict) else response
-        for item in items:
-            self.completions.append(self.format_completion(item))
+    def handle_response(self, response, key=None, prefix='', stdlib_items=None):
+        items = (response["items"] if isinstance(response,
+                                                 dict) else response) or []
+        if stdlib_items:
+            labels = set(item.get("label") for item in items)
+            items = items + [item for item in stdlib_items
+                             if item["label"] not in labels and item["filterText"] not in labels]
+        if key:
+            completion_cache.put(key, prefix, {
+                "items": items,
+                "isIncomplete": isinstance(response, dict) and response.get("isIncomplete", False)
+            })
+        self.completions = self.present_completions(items, prefix)
         sublime.active_window().active_view().run_command('hide_auto_complete')
         self.run_auto_complete()
 
@@ -252,6 +331,60 @@ class EventHandlers(sublime_plugin.EventListener):
             })
 
 
+class DxmateShowStartupTimingsCommand(sublime_plugin.WindowCommand):
+
+    def run(self):
+        printer.show()
+        printer.write('\nLanguage server startup ({}):\n'.format(languageServer.startup_state))
+        printer.write(startup_timings.format() + '\n')
+        stats = languageServer.server_restart_stats()
+        if stats['restarts'] or stats['down_since']:
+            printer.write('restarts: {restarts}, last exit code: {last_exit_code}, '
+                          'downtime: {downtime:.1f}s\n'.format(**stats))
+        if stats['last_stderr']:
+            printer.write('last stderr output:\n' + '\n'.join(stats['last_stderr']) + '\n')
+
+
+class DxmateShowServerResourcesCommand(sublime_plugin.WindowCommand):
+
+    def run(self):
+        stats = languageServer.server_resource_stats()
+        printer.show()
+        printer.write('\nLanguage server resources:\n')
+        if not stats['samples']:
+            printer.write('no samples yet (watchdog_interval is 0, the server is not running, '
+                          'or /proc is not available)\n')
+        else:
+            printer.write('pid {pid}: rss {rss_mb:.0f}MB (peak {peak_rss_mb:.0f}MB), '
+                          'cpu {cpu_percent:.0f}% (avg {avg_cpu_percent:.0f}% over {samples} samples)\n'.format(**stats))
+        printer.write('recycled {recycles} times, last reason: {last_reason}, pending: {pending_recycle}\n'.format(**stats))
+
+
+class DxmateShowLanguageServerStatsCommand(sublime_plugin.WindowCommand):
+
+    def run(self):
+        client = get_client()
+        printer.show()
+        if not client:
+            printer.write('\nLanguage server is not running ({})\n'.format(languageServer.startup_state))
+            return
+        printer.write('\nLanguage server stats:\n')
+        printer.write(format_client_stats(client.get_stats()) + '\n')
+        printer.write('\ndidChange: {suppressed_changes} unchanged suppressed ({suppressed_bytes} bytes)\n'.format(
+            **languageServer.sync_stats))
+        printer.write('completion cache: {hit_rate:.0%} hit rate, {saved_requests} requests saved, '
+                      '{entries} entries\n'.format(**languageServer.completion_cache.stats()))
+        printer.write('hover cache: {hit_rate:.0%} hit rate, {hits} hits, {misses} misses, '
+                      '{entries} entries\n'.format(**hover_cache.stats()))
+        printer.write('popup render cache: {hit_rate:.0%} hit rate, {entries} entries, {bytes} of {budget} bytes, '
+                      '{evictions} evictions\n'.format(**popup_cache.stats()))
+        printer.write('debounce: {timers} timers, {flushes} flushes, {early_flushes} before requests, '
+                      'diagnostics latency {diagnostics_latency_ms} ms\n'.format(
+                          **languageServer.change_scheduler.stats()))
+        if client.inbound is None:
+            printer.write('(turn on lsp_stats for inbound message counts and rates)\n')
+
+
 class DxmateRunFileTestsCommand(sublime_plugin.WindowCommand):
 
     def run(self):
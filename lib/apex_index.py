@@ -0,0 +1,282 @@
+"""
+Offline index of the standard Apex namespaces, classes and members.
+
+The index is built once from a JSON description (sublime/apex/stdlib.json)
+into a compact binary file that is memory-mapped, so looking up the
+members of a class is a binary search over fixed size records without
+parsing anything at load time:
+
+    header   magic, version, record count, offsets, source size and mtime
+    records  sorted by (container, name), each holding offsets and lengths
+             of its strings plus an LSP CompletionItemKind and flags
+    strings  UTF-8, each distinct string stored once
+
+A record's container is the lower-cased name it is reached through:
+'' for top-level names, 'string' for String's members, 'database' for
+both Database's static methods and the Database namespace's classes.
+
+Rebuild from a (larger) JSON description with:
+
+    python3 apex_index.py stdlib.json apex-stdlib.idx
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+MAGIC = b'DXAX'
+INDEX_VERSION = 1
+HEADER = struct.Struct('<4sIIIIQQ')
+RECORD = struct.Struct('<IHIHIHIHBB')
+
+# LSP CompletionItemKind values
+KIND_METHOD = 2
+KIND_CONSTRUCTOR = 4
+KIND_CLASS = 7
+KIND_INTERFACE = 8
+KIND_MODULE = 9
+KIND_PROPERTY = 10
+KIND_ENUM = 13
+KIND_ENUM_MEMBER = 20
+TYPE_KINDS = {'class': KIND_CLASS, 'interface': KIND_INTERFACE, 'enum': KIND_ENUM}
+
+FLAG_STATIC = 1
+
+SIGNATURE_NAME = re.compile(r'(\w+)\s*(\(|$)')
+QUALIFIER = re.compile(r'([A-Za-z_]\w*(?:\s*\.\s*[A-Za-z_]\w*)*)\s*\.\s*$')
+
+
+class Symbol(object):
+
+    __slots__ = ('container', 'name', 'detail', 'doc', 'kind', 'flags')
+
+    def __init__(self, container, name, detail, doc, kind, flags):
+        self.container = container
+        self.name = name
+        self.detail = detail
+        self.doc = doc
+        self.kind = kind
+        self.flags = flags
+
+    @property
+    def is_static(self):
+        return bool(self.flags & FLAG_STATIC)
+
+    def completion_item(self):
+        """The symbol as an LSP CompletionItem"""
+        item = {"label": self.name, "kind": self.kind, "detail": self.detail, "filterText": self.name}
+        if self.doc:
+            item["documentation"] = self.doc
+        if self.kind in (KIND_METHOD, KIND_CONSTRUCTOR):
+            params = self.detail[self.detail.index('(') + 1:self.detail.rindex(')')]
+            item["label"] = "{}({})".format(self.name, params)
+            arguments = ", ".join("${{{}:{}}}".format(index + 1, param.split()[-1])
+                                  for index, param in enumerate(split_parameters(params)))
+            item["insertText"] = "{}({})".format(self.name, arguments)
+            item["insertTextFormat"] = 2
+        return item
+
+    def __repr__(self):
+        return "{}.{}".format(self.container, self.name)
+
+
+def split_parameters(params):
+    """Splits a parameter list on its top-level commas, keeping `Map<String, Object>` whole"""
+    parts = []
+    depth = 0
+    start = 0
+    for position, char in enumerate(params):
+        if char == '<':
+            depth += 1
+        elif char == '>':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(params[start:position])
+            start = position + 1
+    parts.append(params[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def qualifier_before(text):
+    """The dotted name text ends with before a '.', e.g. 'System.String' for 'x = System.String.'"""
+    match = QUALIFIER.search(text)
+    return re.sub(r'\s+', '', match.group(1)) if match else None
+
+
+def parse_member(signature):
+    """Returns (name, kind, flags) of a member signature like 'static Date today()'"""
+    match = SIGNATURE_NAME.search(signature.split('(')[0] + ('(' if '(' in signature else ''))
+    name = match.group(1)
+    flags = FLAG_STATIC if signature.startswith('static ') else 0
+    return name, KIND_METHOD if match.group(2) == '(' else KIND_PROPERTY, flags
+
+
+def source_records(data):
+    """Flattens the JSON description into (container, name, detail, doc, kind, flags)"""
+    records = []
+    system_types = set(data["namespaces"].get('System', {}))
+    for namespace, types in data["namespaces"].items():
+        system = namespace == 'System'
+        if not system and namespace not in system_types:
+            records.append(('', namespace, 'namespace ' + namespace, '', KIND_MODULE, 0))
+        for type_name, description in types.items():
+            kind_name = description.get("kind", "class")
+            qualified = namespace + '.' + type_name
+            detail = '{} {}'.format(kind_name, qualified)
+            for container in ([namespace.lower(), ''] if system else [namespace.lower()]):
+                records.append((container, type_name, detail, description.get("doc", ""),
+                                TYPE_KINDS.get(kind_name, KIND_CLASS), FLAG_STATIC))
+            members = type_name.lower() if system else qualified.lower()
+            docs = description.get("docs", {})
+            for signature in description.get("members", []):
+                name, kind, flags = parse_member(signature)
+                if name == type_name and kind == KIND_METHOD:
+                    kind = KIND_CONSTRUCTOR
+                records.append((members, name, signature, docs.get(name, ""), kind, flags))
+            for value in description.get("values", []):
+                records.append((members, value, '{}.{}'.format(qualified, value), '',
+                                KIND_ENUM_MEMBER, FLAG_STATIC))
+    records.sort(key=lambda record: (record[0], record[1].lower(), record[2]))
+    return records
+
+
+def build_index(source_path, index_path):
+    """Writes the binary index for a JSON description; returns the record count"""
+    with open(source_path, encoding='UTF-8') as f:
+        records = source_records(json.load(f))
+    strings = bytearray()
+    offsets = {}  # type: Dict[str, Tuple[int, int]]
+
+    def intern(text):
+        if text not in offsets:
+            data = text.encode('UTF-8')
+            offsets[text] = (len(strings), len(data))
+            strings.extend(data)
+        return offsets[text]
+
+    packed = bytearray()
+    for container, name, detail, doc, kind, flags in records:
+        packed.extend(RECORD.pack(*(intern(container) + intern(name) + intern(detail) +
+                                    intern(doc) + (kind, flags))))
+    stat = os.stat(source_path)
+    records_offset = HEADER.size
+    strings_offset = records_offset + len(packed)
+    header = HEADER.pack(MAGIC, INDEX_VERSION, len(records), records_offset, strings_offset,
+                         stat.st_size, stat.st_mtime_ns)
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    with open(index_path + '.tmp', 'wb') as f:
+        f.write(header)
+        f.write(packed)
+        f.write(strings)
+    os.replace(index_path + '.tmp', index_path)
+    return len(records)
+
+
+class ApexIndex(object):
+    """Read-only view of a memory-mapped index file"""
+
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, self.records_offset, self.strings_offset,
+         self.source_size, self.source_mtime) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != INDEX_VERSION:
+            self.data.close()
+            raise ValueError("not an Apex index: " + index_path)
+
+    def close(self):
+        self.data.close()
+
+    def string(self, offset, length):
+        start = self.strings_offset + offset
+        return self.data[start:start + length].decode('UTF-8')
+
+    def raw_record(self, index):
+        return RECORD.unpack_from(self.data, self.records_offset + index * RECORD.size)
+
+    def container_at(self, index):
+        fields = self.raw_record(index)
+        return self.string(fields[0], fields[1])
+
+    def symbol(self, index):
+        fields = self.raw_record(index)
+        return Symbol(self.string(fields[0], fields[1]), self.string(fields[2], fields[3]),
+                      self.string(fields[4], fields[5]), self.string(fields[6], fields[7]),
+                      fields[8], fields[9])
+
+    def container_range(self, container):
+        """Returns the (start, end) record indices of a container"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.container_at(middle) < container:
+                low = middle + 1
+            else:
+                high = middle
+        start, high = low, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.container_at(middle) <= container:
+                low = middle + 1
+            else:
+                high = middle
+        return start, low
+
+    def resolve(self, qualifier):
+        """The container for a qualifier as typed, e.g. 'System.String', or None"""
+        container = qualifier.lower()
+        for candidate in (container, container[len('system.'):] if container.startswith('system.') else None):
+            if candidate is not None:
+                start, end = self.container_range(candidate)
+                if end > start:
+                    return candidate
+        return None
+
+    def members(self, container, prefix='', static_only=False):
+        start, end = self.container_range(container)
+        prefix = prefix.lower()
+        symbols = []
+        for index in range(start, end):
+            symbol = self.symbol(index)
+            if static_only and not symbol.is_static:
+                continue
+            if prefix and not symbol.name.lower().startswith(prefix):
+                continue
+            symbols.append(symbol)
+        return symbols
+
+    def lookup(self, container, name):
+        """All overloads of name in container"""
+        name = name.lower()
+        return [symbol for symbol in self.members(container, name) if symbol.name.lower() == name]
+
+    def is_current(self, source_path):
+        """Whether the index was built from source_path as it is now"""
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return True
+        return (stat.st_size, stat.st_mtime_ns) == (self.source_size, self.source_mtime)
+
+
+def open_index(source_path, index_path):
+    """Maps index_path, building it from source_path first if missing or stale"""
+    if os.path.isfile(index_path):
+        try:
+            index = ApexIndex(index_path)
+            if index.is_current(source_path):
+                return index
+            index.close()
+        except (ValueError, OSError, struct.error):
+            pass
+    build_index(source_path, index_path)
+    return ApexIndex(index_path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: apex_index.py <stdlib.json> <index file>")
+    print("{} records written".format(build_index(sys.argv[1], sys.argv[2])))
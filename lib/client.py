@@ -24,19 +24,70 @@ from .request import *
 from .notification import *
 from .util import util
 from .event_hub import EventHub
+from .framing import peek_id, peek_method, loads
+from .transport import MessageWriter, ProcessReader, SocketProcess
+from .handlers import HandlerRegistry
+from .metrics import RateCounter
+from .future import RequestFuture, ResponseError
+from .recorder import TrafficRecorder, INBOUND, OUTBOUND
 import sublime
+import os
 import threading
+import time
+
+# Only the newest of these requests per document is of any use, so an older
+# one still in flight is cancelled when another is sent.
+SUPERSEDED_METHODS = (
+    "textDocument/completion",
+    "textDocument/hover",
+    "textDocument/signatureHelp"
+)
+# Dropping one of these would leave the server with different text than
+# the editor, so they are queued even when the writer is backed up.
+DOCUMENT_SYNC_METHODS = (
+    "textDocument/didOpen",
+    "textDocument/didChange",
+    "textDocument/didSave",
+    "textDocument/didClose"
+)
+DEADLINE_CHECK_INTERVAL = 1000
+SHUTDOWN_TIMEOUT = 5
+EXIT_STDERR_LINES = 20
+# High volume notifications that are dropped before being parsed unless
+# log_server is on, and then only every log_message_sample_rate-th one.
+SAMPLED_NOTIFICATIONS = (
+    "window/logMessage",
+    "telemetry/event"
+)
+
+
 class Client(object):
 
-    def __init__(self, process):
+    def __init__(self, process, on_exit: 'Callable' = None):
         self.process = process
-        self.stdout_thread = threading.Thread(target=self.read_stdout)
-        self.stdout_thread.start()
-        self.stderr_thread = threading.Thread(target=self.read_stderr)
-        self.stderr_thread.start()
+        self.on_exit = on_exit
+        self.stopping = False
+        self.writer = MessageWriter(process.stdin, on_error=self.on_write_error)
         self.request_id = 0
-        self.handlers = {}  # type: Dict[int, Callable]
+        # Requests may be sent from several threads at once
+        self.request_lock = threading.Lock()
+        self.handlers = HandlerRegistry(util.get_setting('request_timeouts'))
+        self.latest_requests = {}  # type: Dict[Tuple[str, str], int]
+        self.cancelled = set()  # type: Set[int]
+        self.sampled_counts = {}  # type: Dict[str, int]
+        self.log_server = util.get_setting('log_server')
+        self.inbound = RateCounter() if util.get_setting('lsp_stats') else None
+        self.log_sample_rate = max(1, util.get_setting('log_message_sample_rate') or 1)
         self.capabilities = {}  # type: Dict[str, Any]
+        self.started_at = time.time()
+        self.last_sent = self.started_at
+        self.initialize_time = None
+        self.launch_info = {}  # type: Dict[str, Any]
+        self.recorder = self.start_recording(util.get_setting('record_traffic_path'))
+        self.reader = ProcessReader(process.stdout, process.stderr,
+                                    self.handle_message, self.handle_exit)
+        self.reader.start()
+        sublime.set_timeout_async(self.check_deadlines, DEADLINE_CHECK_INTERVAL)
 
     def set_capabilities(self, capabilities):
         self.capabilities = capabilities
@@ -47,109 +98,240 @@ class Client(object):
     def get_capability(self, capability):
         return self.capabilities.get(capability)
 
-    def send_request(self, request: Request, handler: 'Callable'):
-        self.request_id += 1
-        if handler is not None:
-            self.handlers[self.request_id] = handler
-        self.send_payload(request.to_payload(self.request_id))
+    def send_request(self, request: Request, handler: 'Callable' = None,
+                     on_timeout: 'Callable' = None) -> RequestFuture:
+        """Sends a request and returns a future for its result.
+
+        handler, if given, is still called with the result on the reader
+        thread; the future can be waited on or given callbacks instead.
+        """
+        future = RequestFuture(request.method)
+        with self.request_lock:
+            self.request_id += 1
+            request_id = self.request_id
+            if request.method in SUPERSEDED_METHODS:
+                self.supersede(request, request_id)
+            self.handlers.add(request_id, request.method, handler,
+                              lambda pending: self.handle_timeout(pending, on_timeout),
+                              future)
+        if not self.send_payload(request.to_payload(request_id)):
+            self.handlers.fail(request_id, ConnectionError("request not sent: " + request.method))
+        return future
+
+    def supersede(self, request: Request, request_id: int):
+        """Cancels the previous request of the same kind for the same document"""
+        text_document = (request.params or {}).get("textDocument") or {}
+        key = (request.method, text_document.get("uri"))
+        previous_id = self.latest_requests.get(key)
+        self.latest_requests[key] = request_id
+        if previous_id is not None and previous_id in self.handlers:
+            self.cancel_request(previous_id)
+
+    def cancel_request(self, request_id: int):
+        """Sends $/cancelRequest and drops the response when it arrives"""
+        pending = self.handlers.discard(request_id)
+        if pending and pending.future:
+            pending.future.cancel()
+        self.cancelled.add(request_id)
+        self.send_notification(Notification.cancelRequest({"id": request_id}))
 
     def send_notification(self, notification: Notification):
         util.debug('notify: ' + notification.method)
-        self.send_payload(notification.to_payload())
+        return self.send_payload(notification.to_payload(),
+                                 required=notification.method in DOCUMENT_SYNC_METHODS)
+
+    def handle_timeout(self, pending, on_timeout=None):
+        util.debug("request timed out:", pending)
+        if on_timeout:
+            on_timeout(pending)
+        if pending.future and not pending.future.done():
+            pending.future.set_exception(TimeoutError(str(pending)))
+
+    def check_deadlines(self):
+        """Evicts requests that passed their deadline, while the server runs"""
+        self.handlers.expire()
+        if self.process and self.process.poll() is None:
+            sublime.set_timeout_async(self.check_deadlines, DEADLINE_CHECK_INTERVAL)
+
+    def get_latency_stats(self):
+        """Returns latency histograms per LSP method"""
+        return self.handlers.latency_stats()
 
     def kill(self):
+        self.stopping = True
+        self.writer.close()
         self.process.kill()
 
-    def send_payload(self, payload):
-        try:
-            message = util.format_request(payload)
-            self.process.stdin.write(bytes(message, 'UTF-8'))
-            self.process.stdin.flush()
-        except BrokenPipeError as e:
-            util.debug("client unexpectedly died:", e)
+    def shutdown(self, stop_daemon=False, on_shutdown=None):
+        """Asks the server to exit normally, killing it if it doesn't in time.
 
-    def read_stdout(self):
-        """
-        Reads JSON responses from process and dispatch them to response_handler
+        A normal exit lets the JVM write its class-data sharing archive.
+        A server behind a daemon supervisor is only detached from, unless
+        stop_daemon is set. on_shutdown runs once the server has answered
+        the shutdown request, i.e. has shut down cleanly.
         """
-        ContentLengthHeader = b"Content-Length: "
-
-        while self.process.poll() is None:
-            try:
-
-                in_headers = True
-                content_length = 0
-                while in_headers:
-                    header = self.process.stdout.readline().strip()
-                    if (len(header) == 0):
-                        in_headers = False
-
-                    if header.startswith(ContentLengthHeader):
-                        content_length = int(header[len(ContentLengthHeader):])
-
-                if (content_length > 0):
-                    content = self.process.stdout.read(content_length).decode(
-                        "UTF-8")
-
-                    payload = None
-                    try:
-                        payload = json.loads(content)
-                        limit = min(len(content), 200)
-                        if payload.get("method") != "window/logMessage":
-                            util.debug("got json: ", content[0:limit])
-                    except IOError:
-                        util.debug("Got a non-JSON payload: ", content)
-                        continue
-
-                    try:
-                        if "error" in payload:
-                            error = payload['error']
-                            util.debug("got error: ", error)
-                            sublime.status_message(error.get('message'))
-                        elif "method" in payload:
-                            if "id" in payload:
-                                self.request_handler(payload)
-                            else:
-                                self.notification_handler(payload)
-                        elif "id" in payload:
-                            self.response_handler(payload)
-                        else:
-                            util.debug("Unknown payload type: ", payload)
-                    except Exception as err:
-                        util.debug("Error handling server content:", err)
-
-            except IOError:
-                printf("LSP stdout process ending due to exception: ",
-                       sys.exc_info())
-                self.process.terminate()
-                self.process = None
-                return
+        self.stopping = True
+        if self.process.poll() is not None or \
+                (isinstance(self.process, SocketProcess) and not stop_daemon):
+            self.kill()
+            return
+        if isinstance(self.process, SocketProcess):
+            self.send_notification(Notification.exit())
+        else:
+            def exit_after_shutdown(result):
+                if on_shutdown:
+                    on_shutdown()
+                self.send_notification(Notification.exit())
+            self.send_request(Request.shutdown(), exit_after_shutdown)
+        timer = threading.Timer(SHUTDOWN_TIMEOUT, self.kill)
+        timer.daemon = True
+        timer.start()
 
-        util.debug("LSP stdout process ended.")
+    def start_recording(self, folder):
+        """Records all traffic to a new file in folder, if one is configured"""
+        if not folder:
+            return None
+        try:
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, time.strftime("lsp-%Y%m%d-%H%M%S.rec"))
+            util.debug("recording language server traffic to", path)
+            return TrafficRecorder(path)
+        except OSError as e:
+            util.debug("could not start recording:", e)
+            return None
 
-    def read_stderr(self):
-        """
-        Reads any errors from the LSP process.
+    def send_payload(self, payload, required=False):
+        """Queues a message for the server; False if it was dropped"""
+        header, body = util.format_request(payload)
+        self.last_sent = time.time()
+        if self.recorder:
+            self.recorder.record(OUTBOUND, body)
+        if not self.writer.send(header, body, required=required):
+            util.debug("dropped outbound message, writer closed or queue full")
+            return False
+        return True
+
+    def on_write_error(self, e):
+        util.debug("client unexpectedly died:", e)
+
+    def get_writer_stats(self):
+        """Returns outbound queue depth and write latency figures"""
+        return self.writer.stats()
+
+    def get_stats(self):
+        """Collects everything shown by the language server stats command.
+
+        Inbound message counts and rates are only kept with lsp_stats on.
         """
-        while self.process.poll() is None:
-            try:
-                content = self.process.stderr.readline()
-                util.debug("(stderr): ", content.strip())
-            except IOError:
-                utl.util.debug("LSP stderr process ending due to exception: ",
-                          sys.exc_info())
+        inbound = None
+        if self.inbound is not None:
+            rates = self.inbound.rates()
+            inbound = dict((method, (count, rates.get(method, 0.0)))
+                           for method, count in self.inbound.last_counts.items())
+        return {
+            "uptime": time.time() - self.started_at,
+            "in_flight": len(self.handlers),
+            "requests": self.handlers.request_stats(),
+            "writer": self.writer.stats(),
+            "bytes_in": self.reader.bytes_read,
+            "inbound": inbound
+        }
+
+    def handle_exit(self):
+        """Called on the reader thread once the server's stdout is closed"""
+        self.writer.close()
+        if isinstance(self.process, SocketProcess):
+            self.process.kill()
+        if self.recorder:
+            self.recorder.close()
+        failed = self.handlers.fail_all(ConnectionError("language server exited"))
+        self.cancelled.clear()
+        util.debug("LSP process ended, failed requests:", len(failed))
+        if not self.stopping:
+            # Unexpected: a JVM crash or OutOfMemoryError only shows up on stderr
+            for line in self.get_stderr(EXIT_STDERR_LINES):
+                print(util.plugin_name(), '(server stderr): ', line)
+        if self.on_exit:
+            self.on_exit(self)
+
+    def exit_code(self):
+        try:
+            self.process.wait(1)
+        except Exception:
+            pass
+        return self.process.poll()
+
+    def get_stderr(self, count=None):
+        """Returns the last lines the server wrote to stderr"""
+        return self.reader.stderr_tail(count)
+
+    def handle_message(self, content):
+        """Decodes a single frame body and dispatches it"""
+        if self.recorder:
+            self.recorder.record(INBOUND, content)
+        method = peek_method(content)
+        # Only responses answer our requests; a server request may reuse a cancelled id
+        if self.cancelled and method is None:
+            request_id = peek_id(content)
+            if request_id in self.cancelled:
+                self.cancelled.discard(request_id)
                 return
 
-        util.debug("LSP stderr process ended.")
+        if self.inbound is not None and method:
+            self.inbound.add(method)
+        if method in SAMPLED_NOTIFICATIONS and self.skip_notification(method):
+            return
+
+        payload = None
+        try:
+            payload = loads(content)
+        except ValueError:
+            util.debug("Got a non-JSON payload: ", content[0:200])
+            return
+
+        if method not in SAMPLED_NOTIFICATIONS:
+            util.debug("got json: ", content[0:200])
+
+        try:
+            if "error" in payload:
+                error = payload['error']
+                util.debug("got error: ", error)
+                if "id" in payload and payload["id"] is not None:
+                    pending = self.handlers.pop(int(payload["id"]))
+                    if pending and pending.future and not pending.future.done():
+                        pending.future.set_exception(ResponseError(error))
+                sublime.status_message(error.get('message'))
+            elif "method" in payload:
+                if "id" in payload:
+                    self.request_handler(payload)
+                else:
+                    self.notification_handler(payload)
+            elif "id" in payload:
+                self.response_handler(payload)
+            else:
+                util.debug("Unknown payload type: ", payload)
+        except Exception as err:
+            util.debug("Error handling server content:", err)
+
+    def skip_notification(self, method):
+        count = self.sampled_counts.get(method, 0) + 1
+        self.sampled_counts[method] = count
+        return not self.log_server or count % self.log_sample_rate != 0
 
     def response_handler(self, response):
         try:
             handler_id = int(response.get("id"))  # dotty sends strings back :(
             result = response.get('result', None)
-            if (self.handlers[handler_id]):
-                self.handlers[handler_id](result)
+            pending = self.handlers.pop(handler_id)
+            if pending:
+                if pending.future and not pending.future.done():
+                    pending.future.set_result(result)
+                if pending.handler:
+                    pending.handler(result)
+            elif handler_id in self.cancelled:
+                self.cancelled.discard(handler_id)
             else:
-                util.debug("No handler found for id" + response.get("id"))
+                util.debug("No handler found for id", handler_id)
         except Exception as e:
             util.debug("error handling response", handler_id)
             raise
@@ -169,9 +351,11 @@ class Client(object):
         elif method == "window/showMessage":
             sublime.active_window().message_dialog(
                 response.get("params").get("message"))
-        elif method == "window/logMessage" and log_server:
-            server_log(self.process.args[0],
-                       response.get("params").get("message"))
+        elif method == "window/logMessage":
+            # Also checked here: skip_notification can't classify every frame
+            if self.log_server:
+                print(util.plugin_name(), '(server): ',
+                      response.get("params").get("message"))
         else:
             util.debug("Unhandled notification:", method)
 
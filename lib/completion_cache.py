@@ -0,0 +1,112 @@
+"""
+Client side cache of completion results.
+
+Results are keyed by document, the line and the text on it up to where
+the word being completed starts (its anchor), and the trigger character
+before it, not by document version. While the user keeps typing the
+same word all of these stay put, so the cached list is narrowed down
+locally instead of asking the server again on every keystroke. Editing
+the expression in front of the word, e.g. replacing `acc.` with `opp.`,
+changes the key.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def item_text(item):
+    return item.get("filterText") or item.get("label") or ""
+
+
+def matches(prefix, text):
+    """Case-insensitive subsequence match, the way Sublime filters completions"""
+    position = 0
+    text = text.lower()
+    for char in prefix.lower():
+        position = text.find(char, position) + 1
+        if not position:
+            return False
+    return True
+
+
+class CompletionEntry(object):
+
+    def __init__(self, prefix, items, incomplete):
+        self.prefix = prefix
+        self.items = items
+        self.incomplete = incomplete
+        self.created = time.time()
+        # The last narrowed down list, so typing on only filters its survivors
+        self.narrowed = (prefix, items)
+
+
+class CompletionCache(object):
+    """LRU cache of completion items by (document, line, text before the anchor, trigger)"""
+
+    def __init__(self, size=32, ttl=30):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # type: OrderedDict[Tuple, CompletionEntry]
+        self.lookups = 0
+        self.hits = 0
+        self.lock = threading.Lock()
+
+    def configure(self, size=None, ttl=None):
+        self.size = size if size is not None else self.size
+        self.ttl = ttl if ttl is not None else self.ttl
+
+    def get(self, key, prefix):
+        """Returns the cached items still matching prefix, or None on a miss.
+
+        Lists the server marked incomplete are only reused for the exact
+        prefix they were produced for.
+        """
+        if not self.size:
+            return None
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry.created > self.ttl:
+                del self.entries[key]
+                return None
+            if not prefix.startswith(entry.prefix) or (entry.incomplete and prefix != entry.prefix):
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        narrowed_prefix, items = entry.narrowed
+        if not prefix.startswith(narrowed_prefix):
+            narrowed_prefix, items = entry.prefix, entry.items
+        if prefix != narrowed_prefix:
+            items = [item for item in items if matches(prefix, item_text(item))]
+            entry.narrowed = (prefix, items)
+        return items
+
+    def put(self, key, prefix, response):
+        """Stores a textDocument/completion response (a list or CompletionList)"""
+        if not self.size:
+            return
+        if isinstance(response, dict):
+            entry = CompletionEntry(prefix, response.get("items") or [], response.get("isIncomplete", False))
+        else:
+            entry = CompletionEntry(prefix, response or [], False)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_requests": self.hits
+        }
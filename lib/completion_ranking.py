@@ -0,0 +1,86 @@
+"""
+Ranking and capping of completion items before they are handed to
+Sublime, which otherwise formats and sorts every one of thousands of
+Schema or SObject field completions.
+"""
+
+import heapq
+
+WORD_SEPARATORS = '_.'
+FORMAT_MEMO_SIZE = 20000
+
+
+def fuzzy_score(prefix, text):
+    """Scores prefix as a subsequence of text, higher is better; None if no match.
+
+    Prefix matches win outright, then matches on word starts (camelCase,
+    _ or .) and unbroken runs; shorter texts win ties.
+    """
+    if not prefix:
+        return 0
+    lower = text.lower()
+    lower_prefix = prefix.lower()
+    if lower.startswith(lower_prefix):
+        return 1000 + (100 if text.startswith(prefix) else 0) - len(text)
+    score = 0
+    position = 0
+    previous = -2
+    for char in lower_prefix:
+        index = lower.find(char, position)
+        if index < 0:
+            return None
+        if index == previous + 1:
+            score += 5
+        if index == 0 or text[index].isupper() or text[index - 1] in WORD_SEPARATORS:
+            score += 10
+        score -= index - position
+        previous = index
+        position = index + 1
+    return score - len(text)
+
+
+def rank(items, prefix, limit=0, key=None):
+    """Returns the best limit items for prefix, best first (all when limit is 0).
+
+    Without a prefix the server's order is kept.
+    """
+    if not prefix:
+        return items[:limit] if limit else items
+    scored = []
+    for index, item in enumerate(items):
+        score = fuzzy_score(prefix, key(item) if key else item)
+        if score is not None:
+            scored.append((score, -index, item))
+    if limit and len(scored) > limit:
+        scored = heapq.nlargest(limit, scored, key=lambda entry: entry[:2])
+    else:
+        scored.sort(key=lambda entry: entry[:2], reverse=True)
+    return [entry[2] for entry in scored]
+
+
+class Memo(object):
+    """Remembers fn(item) by a key derived from the item.
+
+    Completion items for the same symbols come back in every response,
+    so each is formatted once. The memo is dropped wholesale when full.
+    """
+
+    def __init__(self, fn, key, size=FORMAT_MEMO_SIZE):
+        self.fn = fn
+        self.key = key
+        self.size = size
+        self.values = {}  # type: Dict[Any, Any]
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, item):
+        key = self.key(item)
+        value = self.values.get(key)
+        if value is None:
+            self.misses += 1
+            if len(self.values) >= self.size:
+                self.values.clear()
+            value = self.values[key] = self.fn(item)
+        else:
+            self.hits += 1
+        return value
@@ -0,0 +1,147 @@
+"""
+Finding, starting and attaching to a language server run by supervisor.py.
+"""
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import time
+from .transport import SocketProcess
+
+STATE_FILE = 'dxmate-daemon.json'
+CONNECT_TIMEOUT = 2
+CONNECT_RETRIES = 3
+SPAWN_TIMEOUT = 15
+STOP_TIMEOUT = 5
+
+
+def state_file(project_folder):
+    return os.path.join(project_folder, '.sfdx', 'tools', STATE_FILE)
+
+
+def read_state(project_folder):
+    try:
+        with open(state_file(project_folder)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def connect(project_folder):
+    """Returns a SocketProcess for a healthy supervisor of the project, or None"""
+    state = read_state(project_folder)
+    if not state:
+        return None
+    try:
+        sock = socket.create_connection(("127.0.0.1", state["port"]), CONNECT_TIMEOUT)
+    except (OSError, KeyError):
+        return None
+    try:
+        sock.sendall((state["token"] + "\n").encode("ascii"))
+        if sock.recv(3) != b"ok\n":
+            sock.close()
+            return None
+    except (OSError, KeyError):
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return SocketProcess(sock, state.get("server_pid"))
+
+
+def proc_cmdline(pid):
+    try:
+        with open('/proc/{}/cmdline'.format(pid), 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def stop_process(pid):
+    """SIGTERM, then SIGKILL if pid is still there after STOP_TIMEOUT"""
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        return
+    deadline = time.time() + STOP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            return
+        time.sleep(0.1)
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def stop_supervisor(state):
+    """Stops the supervisor and server of a state file that can't be attached to.
+
+    Where /proc can tell, a supervisor pid that is gone or was reused by
+    another process since is left alone.
+    """
+    pid = state.get("pid")
+    if not pid:
+        return
+    if os.path.isdir('/proc'):
+        cmdline = proc_cmdline(pid)
+        if cmdline is None or b'supervisor.py' not in cmdline:
+            return
+    if os.name == 'nt':
+        # Takes the server down with the supervisor's process tree
+        subprocess.call(['taskkill', '/F', '/T', '/PID', str(pid)], stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL, creationflags=0x08000000)  # CREATE_NO_WINDOW
+        return
+    for target in (state.get("server_pid"), pid):
+        if target:
+            stop_process(target)
+
+
+def spawn(project_folder, python, command, idle_timeout, startupinfo=None):
+    """Starts a detached supervisor for command and attaches to it.
+
+    A supervisor still listed in the state file is given a few more
+    chances to answer, and stopped if it doesn't, so two servers never
+    index the same project.
+    """
+    path = state_file(project_folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state = read_state(project_folder)
+    if state:
+        for attempt in range(CONNECT_RETRIES):
+            process = connect(project_folder)
+            if process:
+                return process
+            time.sleep(0.5)
+        stop_supervisor(state)
+    if os.path.isfile(path):
+        os.remove(path)
+    args = [python, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'supervisor.py'),
+            '--state-file', path,
+            '--cwd', project_folder,
+            '--log-file', os.path.join(os.path.dirname(path), 'dxmate-daemon.log'),
+            '--idle-timeout', str(idle_timeout),
+            '--'] + command
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = 0x00000008 | 0x00000200  # DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP
+        kwargs['startupinfo'] = startupinfo
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, cwd=project_folder, **kwargs)
+    deadline = time.time() + SPAWN_TIMEOUT
+    while time.time() < deadline:
+        if os.path.isfile(path):
+            process = connect(project_folder)
+            if process:
+                return process
+        time.sleep(0.1)
+    return None
+
+
+def default_python():
+    return 'python' if os.name == 'nt' else 'python3'
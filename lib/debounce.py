@@ -0,0 +1,122 @@
+"""
+Debouncing of textDocument/didChange, one timer per buffer.
+"""
+
+import threading
+import time
+
+# Weight of the newest sample in the moving average of diagnostics latency
+LATENCY_WEIGHT = 0.2
+
+
+class ChangeScheduler(object):
+    """Sends a buffer's changes once typing pauses.
+
+    Every change only moves the buffer's deadline; the buffer's single
+    timer re-arms itself for the remainder when it fires early, instead
+    of a new timer being scheduled per keystroke. The pause waited for
+    grows with the document size and with how long the server recently
+    took to answer a didChange with diagnostics, up to max_delay.
+    flush() sends a buffer's changes right away, before requests that
+    need the server to see the current text.
+    """
+
+    def __init__(self, set_timeout, on_flush, min_delay=200, max_delay=1500, ms_per_kb=1.0):
+        self.set_timeout = set_timeout
+        self.on_flush = on_flush
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.ms_per_kb = ms_per_kb
+        self.pending = {}  # type: Dict[int, List]  # buffer id -> [deadline, view, timer token]
+        self.sent = {}  # type: Dict[str, float]
+        self.diagnostics_latency = None  # type: Optional[float]
+        self.timers = 0
+        self.flushes = 0
+        self.early_flushes = 0
+        self.next_token = 0
+        self.lock = threading.Lock()
+
+    def configure(self, min_delay=None, max_delay=None):
+        self.min_delay = min_delay or self.min_delay
+        self.max_delay = max(max_delay or self.max_delay, self.min_delay)
+
+    def delay_for(self, size):
+        """Milliseconds to wait after a change to a document of size characters"""
+        delay = self.min_delay + size / 1024.0 * self.ms_per_kb
+        if self.diagnostics_latency:
+            delay = max(delay, self.diagnostics_latency / 2)
+        return min(delay, self.max_delay)
+
+    def schedule(self, buffer_id, view, size):
+        delay = self.delay_for(size)
+        deadline = time.time() + delay / 1000.0
+        with self.lock:
+            entry = self.pending.get(buffer_id)
+            if entry:
+                entry[0] = deadline
+                entry[1] = view
+                return
+            self.next_token += 1
+            token = self.next_token
+            self.pending[buffer_id] = [deadline, view, token]
+        self.arm(buffer_id, token, delay)
+
+    def arm(self, buffer_id, token, delay):
+        self.timers += 1
+        self.set_timeout(lambda: self.fire(buffer_id, token), max(1, int(delay)))
+
+    def fire(self, buffer_id, token):
+        with self.lock:
+            entry = self.pending.get(buffer_id)
+            if not entry or entry[2] != token:
+                return
+            remaining = (entry[0] - time.time()) * 1000
+            if remaining < 1:
+                del self.pending[buffer_id]
+        if remaining >= 1:
+            self.arm(buffer_id, token, remaining)
+            return
+        self.flushes += 1
+        self.on_flush(entry[1])
+
+    def flush(self, buffer_id):
+        """Sends the buffer's pending changes now; False if there were none"""
+        with self.lock:
+            entry = self.pending.pop(buffer_id, None)
+        if not entry:
+            return False
+        self.early_flushes += 1
+        self.on_flush(entry[1])
+        return True
+
+    def discard(self, buffer_id):
+        with self.lock:
+            self.pending.pop(buffer_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.sent.clear()
+
+    def change_sent(self, uri):
+        self.sent[uri] = time.time()
+
+    def diagnostics_received(self, uri):
+        """Feeds the time from the last didChange of uri to its diagnostics"""
+        sent = self.sent.pop(uri, None)
+        if sent is None:
+            return
+        latency = (time.time() - sent) * 1000
+        if self.diagnostics_latency is None:
+            self.diagnostics_latency = latency
+        else:
+            self.diagnostics_latency += (latency - self.diagnostics_latency) * LATENCY_WEIGHT
+
+    def stats(self):
+        return {
+            "pending": len(self.pending),
+            "timers": self.timers,
+            "flushes": self.flushes,
+            "early_flushes": self.early_flushes,
+            "diagnostics_latency_ms": self.diagnostics_latency
+        }
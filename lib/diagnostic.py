@@ -25,7 +25,7 @@ from collections import OrderedDict
 import sublime
 from .util import util
 from .event_hub import EventHub
-import mdpopups
+from .hover import show_hover_popup, show_symbol_hover
 show_diagnostics_phantoms = True
 UNDERLINE_FLAGS = (sublime.DRAW_NO_FILL
                    | sublime.DRAW_NO_OUTLINE
@@ -292,17 +292,7 @@ def show_diagnostics_hover(view, point, diagnostics):
     #util.debug('got diagnostics: ', diagnostics)
     formatted = list("{}: {}".format(format_severity(diagnostic.severity), diagnostic.message) for diagnostic in diagnostics)
     #formatted.append("[{}]({})".format('Code Actions', 'code-actions'))
-    mdpopups.show_popup(
-        view,
-        "\n".join(formatted),
-        css=".mdpopups .lsp_hover { margin: 4px; }",
-        md=True,
-        flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-        location=point,
-        wrapper_class="lsp_hover",
-        max_width=800,
-        #on_navigate=lambda href: self.on_diagnostics_navigate(self, href, point, diagnostics)
-        )
+    show_hover_popup(view, point, "\n".join(formatted))
 
 def handle_hover(view, point, hover_zone):
     if util.is_apex_file(view):
@@ -312,6 +302,8 @@ def handle_hover(view, point, hover_zone):
         line_diagnostics = get_line_diagnostics(view, point)
         if line_diagnostics:
             show_diagnostics_hover(view, point, line_diagnostics)
+        else:
+            show_symbol_hover(view, point)
 EventHub.subscribe('on_hover', handle_hover)
 EventHub.subscribe('document.diagnostics', handle_diagnostics)
 EventHub.subscribe('on_close', remove_diagnostics)
\ No newline at end of file
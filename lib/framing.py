@@ -0,0 +1,145 @@
+"""
+JSON-RPC frame handling for the language server pipes.
+
+This module only depends on the standard library so it can be exercised
+outside of Sublime (see the scripts in benchmarks/).
+"""
+
+import json
+import os
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        fast_json = None
+
+CONTENT_LENGTH = b"content-length:"
+HEADER_END = b"\r\n\r\n"
+READ_CHUNK_SIZE = 65536
+
+
+class FrameReader(object):
+    """Splits a byte stream into LSP message bodies.
+
+    Data is appended to a single reusable buffer and complete frames are
+    cut out of it using the byte length from the Content-Length header, so
+    a chunk can contain any number of (partial) messages.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.content_length = -1
+        self.messages = 0
+        self.bytes_read = 0
+
+    def feed(self, data):
+        """Adds data to the buffer and returns the list of complete bodies"""
+        self.bytes_read += len(data)
+        buf = self.buffer
+        buf += data
+        frames = []
+        start = 0
+        while True:
+            if self.content_length < 0:
+                header_end = buf.find(HEADER_END, start)
+                if header_end < 0:
+                    break
+                self.content_length = self.parse_headers(buf[start:header_end])
+                start = header_end + len(HEADER_END)
+            end = start + self.content_length
+            if end > len(buf):
+                break
+            frames.append(bytes(buf[start:end]))
+            start = end
+            self.content_length = -1
+        if start:
+            del buf[:start]
+        self.messages += len(frames)
+        return frames
+
+    def parse_headers(self, headers):
+        for line in bytes(headers).split(b"\r\n"):
+            if line.lower().startswith(CONTENT_LENGTH):
+                return int(line[len(CONTENT_LENGTH):].strip())
+        return 0
+
+    def read_from(self, fd, on_message, chunk_size=READ_CHUNK_SIZE):
+        """Reads fd until EOF, calling on_message for every frame body"""
+        while True:
+            data = os.read(fd, chunk_size)
+            if not data:
+                return
+            for frame in self.feed(data):
+                on_message(frame)
+
+
+ID_KEY = b'"id":'
+METHOD_KEY = b'"method":'
+PEEK_LIMIT = 128
+
+
+def peek_id(body, limit=PEEK_LIMIT):
+    """Returns the top level id of a message without parsing it.
+
+    Only the start of the body is scanned, and only up to the first nested
+    object, so an "id" inside params or result is never picked up. Returns
+    None when the id can't be found cheaply.
+    """
+    index = body.find(ID_KEY, 0, limit)
+    if index < 0 or body.find(b"{", 1, index) >= 0:
+        return None
+    start = index + len(ID_KEY)
+    while body[start:start + 1] in (b" ", b'"'):
+        start += 1
+    end = start
+    while body[end:end + 1].isdigit():
+        end += 1
+    if end == start:
+        return None
+    return int(body[start:end])
+
+
+def peek_method(body, limit=PEEK_LIMIT):
+    """Returns the top level method of a message without parsing it.
+
+    Like peek_id this gives up (returns None) rather than guess when the
+    method isn't in the first bytes ahead of any nested object.
+    """
+    index = body.find(METHOD_KEY, 0, limit)
+    if index < 0 or body.find(b"{", 1, index) >= 0:
+        return None
+    start = body.find(b'"', index + len(METHOD_KEY))
+    end = body.find(b'"', start + 1)
+    if start < 0 or end < 0:
+        return None
+    return body[start + 1:end].decode("UTF-8")
+
+
+def loads(body):
+    """Parses a UTF-8 message body, with orjson or ujson when available"""
+    if fast_json:
+        return fast_json.loads(body)
+    return json.loads(body.decode("UTF-8"))
+
+
+def encode_header(content_length):
+    return ("Content-Length: %d\r\n\r\n" % content_length).encode("ascii")
+
+
+def encode_payload(payload):
+    """Serializes a payload to (header, body) bytes.
+
+    The body is encoded exactly once and the Content-Length is taken from
+    its byte length, so non-ASCII source text is framed correctly. Non-ASCII
+    characters are escaped by json, which keeps the encode on its fast
+    ASCII path.
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode("ascii")
+    return encode_header(len(body)), body
+
+
+def encode_frame(body):
+    """Prefixes an already encoded message body with its header"""
+    return encode_header(len(body)) + body
@@ -0,0 +1,77 @@
+"""
+Futures returned by Client.send_request.
+"""
+
+import concurrent.futures
+import threading
+import sublime
+
+
+class ResponseError(Exception):
+    """An error response from the language server"""
+
+    def __init__(self, error):
+        Exception.__init__(self, error.get("message"))
+        self.code = error.get("code")
+        self.data = error.get("data")
+
+
+class RequestFuture(concurrent.futures.Future):
+    """Result of a request to the language server.
+
+    Besides the standard Future API (result(timeout), add_done_callback,
+    ...) callbacks can be run on Sublime's main thread, which is where
+    anything touching views has to happen.
+    """
+
+    def __init__(self, method=None):
+        concurrent.futures.Future.__init__(self)
+        self.method = method
+
+    def on_main_thread(self, callback: 'Callable[[RequestFuture], None]'):
+        self.add_done_callback(
+            lambda future: sublime.set_timeout(lambda: callback(future), 0))
+        return self
+
+    def on_result(self, callback: 'Callable[[Any], None]', main_thread=True):
+        """Runs callback with the result, if the request succeeds"""
+        def done(future):
+            if not future.cancelled() and future.exception() is None:
+                callback(future.result())
+        if main_thread:
+            return self.on_main_thread(done)
+        self.add_done_callback(done)
+        return self
+
+
+def wait_all(futures, timeout=None):
+    """Blocks until every future is done and returns their results in order.
+
+    A failed or cancelled request yields None in its place. Must not be
+    called from the main thread.
+    """
+    futures = list(futures)
+    concurrent.futures.wait(futures, timeout=timeout)
+    return [future.result() if future.done() and not future.cancelled()
+            and future.exception() is None else None for future in futures]
+
+
+def combine(futures):
+    """Returns a future resolving to the list of results of all futures"""
+    futures = list(futures)
+    combined = RequestFuture()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(future):
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            combined.set_result(wait_all(futures, 0))
+
+    if not futures:
+        combined.set_result([])
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
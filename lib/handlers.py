@@ -0,0 +1,129 @@
+"""
+Bookkeeping for requests sent to the language server that await a response.
+"""
+
+import threading
+import time
+from .metrics import LatencyHistogram
+
+
+class PendingRequest(object):
+
+    def __init__(self, request_id, method, handler, deadline, on_timeout, future=None):
+        self.request_id = request_id
+        self.method = method
+        self.handler = handler
+        self.future = future
+        self.sent = time.time()
+        self.deadline = deadline
+        self.on_timeout = on_timeout
+
+    def elapsed_ms(self, now=None):
+        return ((now or time.time()) - self.sent) * 1000
+
+    def __repr__(self):
+        return "{} {}".format(self.request_id, self.method)
+
+
+class HandlerRegistry(object):
+    """Tracks in-flight requests by id.
+
+    Every entry records the method and send time. Entries are removed when
+    their response (or error) arrives, when they are cancelled, or when
+    their deadline passes, so the registry only ever holds requests that
+    are genuinely outstanding. Response times are kept per method in
+    latency histograms.
+    """
+
+    def __init__(self, timeouts=None):
+        self.timeouts = timeouts or {}  # type: Dict[str, float]
+        self.pending = {}  # type: Dict[int, PendingRequest]
+        self.histograms = {}  # type: Dict[str, LatencyHistogram]
+        self.timed_out = {}  # type: Dict[str, int]
+        self.sent = {}  # type: Dict[str, int]
+        self.lock = threading.Lock()
+
+    def timeout_for(self, method):
+        return self.timeouts.get(method, self.timeouts.get("default"))
+
+    def add(self, request_id, method, handler, on_timeout=None, future=None):
+        timeout = self.timeout_for(method)
+        deadline = time.time() + timeout if timeout else None
+        entry = PendingRequest(request_id, method, handler, deadline, on_timeout, future)
+        with self.lock:
+            self.pending[request_id] = entry
+            self.sent[method] = self.sent.get(method, 0) + 1
+        return entry
+
+    def pop(self, request_id):
+        """Removes the entry for a response and records its latency"""
+        with self.lock:
+            entry = self.pending.pop(request_id, None)
+            if entry:
+                self.histogram(entry.method).add(entry.elapsed_ms())
+        return entry
+
+    def discard(self, request_id):
+        """Removes an entry without recording a latency, e.g. when cancelled"""
+        with self.lock:
+            return self.pending.pop(request_id, None)
+
+    def expire(self, now=None):
+        """Evicts entries past their deadline and runs their timeout callbacks"""
+        now = now or time.time()
+        with self.lock:
+            expired = [entry for entry in self.pending.values()
+                       if entry.deadline and entry.deadline <= now]
+            for entry in expired:
+                del self.pending[entry.request_id]
+                self.timed_out[entry.method] = self.timed_out.get(entry.method, 0) + 1
+        for entry in expired:
+            if entry.on_timeout:
+                entry.on_timeout(entry)
+        return expired
+
+    def fail(self, request_id, error):
+        """Evicts one entry, failing its future with error, e.g. when it could not be sent"""
+        with self.lock:
+            entry = self.pending.pop(request_id, None)
+        if entry and entry.future and not entry.future.done():
+            entry.future.set_exception(error)
+        return entry
+
+    def fail_all(self, error):
+        """Evicts every entry, failing its future with error"""
+        with self.lock:
+            failed = list(self.pending.values())
+            self.pending.clear()
+        for entry in failed:
+            if entry.future and not entry.future.done():
+                entry.future.set_exception(error)
+        return failed
+
+    def histogram(self, method):
+        histogram = self.histograms.get(method)
+        if histogram is None:
+            histogram = self.histograms[method] = LatencyHistogram()
+        return histogram
+
+    def request_stats(self):
+        """Latency figures plus sent and timed out counts for every method"""
+        with self.lock:
+            stats = {}
+            for method, count in self.sent.items():
+                histogram = self.histograms.get(method) or LatencyHistogram()
+                stats[method] = histogram.to_dict()
+                stats[method]["sent"] = count
+                stats[method]["timed_out"] = self.timed_out.get(method, 0)
+            return stats
+
+    def latency_stats(self):
+        with self.lock:
+            return dict((method, histogram.to_dict())
+                        for method, histogram in self.histograms.items())
+
+    def __contains__(self, request_id):
+        return request_id in self.pending
+
+    def __len__(self):
+        return len(self.pending)
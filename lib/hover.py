@@ -0,0 +1,199 @@
+"""
+Hover popups for the symbol under the mouse.
+
+Standard Apex symbols are described from the offline index. Everything
+else is asked of the language server, and the answers are cached by
+(file, document version, word range): hovering the same identifier
+again does not reach the server until the document changes.
+"""
+
+import threading
+import sublime
+import mdpopups
+from collections import OrderedDict
+from .apex_index import qualifier_before
+from .event_hub import EventHub
+from .popup_cache import RenderCache
+from .request import Request
+from .util import util
+from . import languageServer
+
+HOVER_CSS = ".mdpopups .lsp_hover { margin: 4px; }"
+HOVER_CACHE_SIZE = 256
+
+
+class HoverCache(object):
+    """LRU of hover contents by (path, version, word range); None is a valid answer"""
+
+    def __init__(self, size=HOVER_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()  # type: OrderedDict[Tuple, Optional[str]]
+        self.in_flight = set()  # type: Set[Tuple]
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (found, content)"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, content):
+        with self.lock:
+            self.in_flight.discard(key)
+            self.entries[key] = content
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def start_request(self, key):
+        """False if a request for key is already on its way"""
+        with self.lock:
+            if key in self.in_flight:
+                return False
+            self.in_flight.add(key)
+            return True
+
+    def finish_request(self, key):
+        with self.lock:
+            self.in_flight.discard(key)
+
+    def invalidate(self, path, version=None):
+        """Drops the entries of path for versions other than version (all for None)"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == path and key[1] != version]:
+                del self.entries[key]
+            self.in_flight = set(key for key in self.in_flight if key[0] != path or key[1] == version)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.in_flight.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+hover_cache = HoverCache()
+popup_cache = RenderCache()
+
+
+def render_popup(view, content):
+    """HTML for markdown content in the view's colour scheme, rendered once per scheme"""
+    popup_cache.configure((util.get_setting('popup_cache_kb') or 0) * 1024)
+    key = (content, view.settings().get('color_scheme') or '')
+    return popup_cache.render(key, lambda: mdpopups.md2html(view, content))
+
+
+def show_hover_popup(view, point, content):
+    """Shows markdown content in a popup; shared by diagnostics and symbol hovers"""
+    mdpopups.show_popup(
+        view,
+        render_popup(view, content),
+        css=HOVER_CSS,
+        md=False,
+        flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+        location=point,
+        wrapper_class="lsp_hover",
+        max_width=800)
+
+
+def format_symbols(symbols):
+    """Markdown for the overloads of a standard symbol: signatures, then the doc"""
+    lines = ["```java\n{}\n```".format(symbol.detail) for symbol in symbols]
+    doc = next((symbol.doc for symbol in symbols if symbol.doc), '')
+    if doc:
+        lines.append(doc)
+    return "\n".join(lines)
+
+
+def format_marked_string(content):
+    if isinstance(content, dict):
+        if "language" in content:
+            return "```{}\n{}\n```".format(content["language"], content.get("value", ""))
+        return content.get("value", "")
+    return content or ""
+
+
+def format_hover(hover):
+    """Markdown for an LSP Hover result, or None when there is nothing to show"""
+    if not hover:
+        return None
+    contents = hover.get("contents")
+    if isinstance(contents, list):
+        text = "\n\n".join(format_marked_string(content) for content in contents)
+    else:
+        text = format_marked_string(contents)
+    return text if text.strip() else None
+
+
+def stdlib_hover(view, point):
+    """Markdown describing the standard Apex symbol at point, or None"""
+    index = languageServer.get_stdlib_index()
+    if not index:
+        return None
+    word = view.word(point)
+    name = view.substr(word).strip()
+    if not name or not (name[0].isalpha() or name[0] == '_'):
+        return None
+    qualifier = qualifier_before(view.substr(sublime.Region(view.line(word).a, word.a)))
+    container = index.resolve(qualifier) if qualifier else ''
+    if container is None:
+        return None
+    symbols = index.lookup(container, name)
+    return format_symbols(symbols) if symbols else None
+
+
+def request_hover(view, point):
+    """Shows the server's hover for point, from the cache when the document is unchanged.
+
+    Nothing is asked while the buffer has changes waiting to be sent,
+    i.e. while the user is typing, or while the same hover is in flight.
+    """
+    client = languageServer.get_client()
+    path = view.file_name()
+    if not client or not client.get_capability('hoverProvider') or \
+            path not in languageServer.document_states:
+        return
+    word = view.word(point)
+    key = (path, languageServer.document_states[path].version, word.a, word.b)
+    found, content = hover_cache.get(key)
+    if found:
+        if content:
+            show_hover_popup(view, point, content)
+        return
+    if view.buffer_id() in languageServer.change_scheduler.pending or not hover_cache.start_request(key):
+        return
+
+    def handle_response(result):
+        content = format_hover(result)
+        hover_cache.put(key, content)
+        if content:
+            sublime.set_timeout(lambda: show_hover_popup(view, point, content), 0)
+
+    future = languageServer.send_document_request(
+        view, Request.hover(util.get_document_position(view, point)), handle_response)
+    if future:
+        # Superseded, timed out or failed requests must not block the key
+        future.add_done_callback(lambda future: hover_cache.finish_request(key))
+
+
+def show_symbol_hover(view, point):
+    content = stdlib_hover(view, point)
+    if content:
+        show_hover_popup(view, point, content)
+    else:
+        request_hover(view, point)
+
+
+EventHub.subscribe('document.version', hover_cache.invalidate)
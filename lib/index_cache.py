@@ -0,0 +1,135 @@
+"""
+Decides whether the language server's Apex index (.sfdx/tools/apex.db)
+can be reused on startup.
+
+Next to the db a fingerprint of the project's Apex sources is kept. If
+the sources still match it, or only a few files changed, the db is kept
+and the server only has to catch up on those files instead of
+re-indexing the whole project.
+
+The fingerprint is removed as soon as a server is started on the db and
+only written again once that server shut down cleanly, so a db left
+behind by an interrupted (re)index is never mistaken for a complete one.
+"""
+
+import json
+import os
+import zlib
+
+SOURCE_EXTENSIONS = ('.cls', '.trigger')
+SKIP_FOLDERS = ('.sfdx', '.sf', '.git', 'node_modules')
+FINGERPRINT_FILE = 'dxmate-apex-db.json'
+FINGERPRINT_VERSION = 1
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+def apex_db_path(project_folder):
+    return os.path.join(project_folder, '.sfdx', 'tools', 'apex.db')
+
+
+def fingerprint_path(project_folder):
+    return os.path.join(project_folder, '.sfdx', 'tools', FINGERPRINT_FILE)
+
+
+def file_fingerprint(path, use_content):
+    stat = os.stat(path)
+    if use_content:
+        with open(path, 'rb') as f:
+            return [stat.st_size, zlib.crc32(f.read()) & 0xffffffff]
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def fingerprint_sources(project_folder, use_content=False):
+    """Maps the relative path of every Apex source to its size and mtime or crc"""
+    sources = {}
+    for root, dirs, files in os.walk(project_folder):
+        dirs[:] = [d for d in dirs if d not in SKIP_FOLDERS]
+        for name in files:
+            if name.endswith(SOURCE_EXTENSIONS):
+                path = os.path.join(root, name)
+                try:
+                    sources[os.path.relpath(path, project_folder)] = file_fingerprint(path, use_content)
+                except OSError:
+                    pass
+    return sources
+
+
+def load_fingerprint(project_folder):
+    try:
+        with open(fingerprint_path(project_folder)) as f:
+            data = json.load(f)
+        if data.get('version') == FINGERPRINT_VERSION:
+            return data
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def save_fingerprint(project_folder, sources, use_content=False):
+    """Marks the db as complete for sources; only call once the server shut down cleanly"""
+    data = {'version': FINGERPRINT_VERSION, 'content': use_content, 'sources': sources}
+    path = fingerprint_path(project_folder)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+    except (IOError, OSError):
+        pass
+
+
+def remove_fingerprint(project_folder):
+    try:
+        os.remove(fingerprint_path(project_folder))
+    except (IOError, OSError):
+        pass
+
+
+def count_changes(old_sources, new_sources):
+    """Number of files added, removed or modified between two fingerprints"""
+    changed = len(set(old_sources) ^ set(new_sources))
+    for path, fingerprint in new_sources.items():
+        if path in old_sources and old_sources[path] != fingerprint:
+            changed += 1
+    return changed
+
+
+def db_looks_valid(db_path):
+    """Cheap corruption check: a non-empty file starting with the sqlite header"""
+    try:
+        with open(db_path, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except (IOError, OSError):
+        return False
+
+
+def remove_db(db_path):
+    for path in (db_path, db_path + '-journal', db_path + '-wal', db_path + '-shm'):
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def prepare_apex_db(project_folder, reuse=True, max_changed=0, use_content=False):
+    """Keeps or deletes apex.db before the server starts.
+
+    Returns (action, changed) where action is 'missing', 'reused' or
+    'deleted' and changed the number of source files that differ from
+    the stored fingerprint (None when there was nothing to compare).
+    The fingerprint itself is removed, see save_fingerprint.
+    """
+    db_path = apex_db_path(project_folder)
+    stored = load_fingerprint(project_folder)
+    remove_fingerprint(project_folder)
+    if not os.path.isfile(db_path):
+        return 'missing', None
+
+    changed = None
+    if stored and stored.get('content') == use_content:
+        changed = count_changes(stored.get('sources', {}), fingerprint_sources(project_folder, use_content))
+
+    if reuse and changed is not None and changed <= max_changed and db_looks_valid(db_path):
+        action = 'reused'
+    else:
+        remove_db(db_path)
+        action = 'deleted'
+    return action, changed
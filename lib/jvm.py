@@ -0,0 +1,85 @@
+"""
+JVM arguments for launching the Apex language server: the configured
+launch profile and an application class-data sharing (AppCDS) archive.
+
+The archive is keyed by the jar and the java runtime, so it is
+regenerated when either changes. It is written by the JVM itself when
+the server exits normally (-XX:ArchiveClassesAtExit, JDK 13+) and used
+by every later launch (-XX:SharedArchiveFile).
+"""
+
+import glob
+import hashlib
+import os
+import re
+import subprocess
+
+ARCHIVE_PREFIX = 'apex-jorje-'
+VERSION_PATTERN = re.compile(r'version "([^"]+)"')
+GC_FLAGS = {
+    'g1': '-XX:+UseG1GC',
+    'parallel': '-XX:+UseParallelGC',
+    'serial': '-XX:+UseSerialGC',
+    'z': '-XX:+UseZGC',
+    'shenandoah': '-XX:+UseShenandoahGC'
+}
+
+java_versions = {}  # type: Dict[str, Tuple[str, int]]
+
+
+def java_version(java_cmd, startupinfo=None):
+    """Returns (version string, major version) of a java binary, cached"""
+    if java_cmd not in java_versions:
+        version, major = '', 0
+        try:
+            output = subprocess.check_output([java_cmd, '-version'], stderr=subprocess.STDOUT,
+                                             startupinfo=startupinfo).decode('UTF-8', 'replace')
+            match = VERSION_PATTERN.search(output)
+            if match:
+                version = match.group(1)
+                parts = version.split('.')
+                major = int(parts[1] if parts[0] == '1' else re.match(r'\d+', parts[0]).group(0))
+        except (OSError, subprocess.CalledProcessError, ValueError, AttributeError):
+            pass
+        java_versions[java_cmd] = (version, major)
+    return java_versions[java_cmd]
+
+
+def archive_path(cache_dir, jar_path, version):
+    stat = os.stat(jar_path)
+    key = '{}:{}:{}'.format(stat.st_size, stat.st_mtime_ns, version)
+    digest = hashlib.sha1(key.encode('UTF-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, ARCHIVE_PREFIX + digest + '.jsa')
+
+
+def cds_args(java_cmd, jar_path, cache_dir, startupinfo=None):
+    """Returns (args, state) where state is 'on', 'dumping' or 'unsupported'"""
+    version, major = java_version(java_cmd, startupinfo)
+    if major < 13 or not os.path.isfile(jar_path):
+        return [], 'unsupported'
+    archive = archive_path(cache_dir, jar_path, version)
+    if os.path.isfile(archive):
+        return ['-XX:SharedArchiveFile=' + archive, '-Xshare:auto'], 'on'
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(cache_dir, ARCHIVE_PREFIX + '*.jsa')):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    return ['-XX:ArchiveClassesAtExit=' + archive], 'dumping'
+
+
+def profile_args(profile):
+    """Translates a launch profile from the settings into JVM flags"""
+    args = []
+    if profile.get('heap_min'):
+        args.append('-Xms' + profile['heap_min'])
+    if profile.get('heap_max'):
+        args.append('-Xmx' + profile['heap_max'])
+    gc = (profile.get('gc') or '').lower()
+    if gc in GC_FLAGS:
+        args.append(GC_FLAGS[gc])
+    if profile.get('tiered_stop_at_level') is not None:
+        args.append('-XX:TieredStopAtLevel={}'.format(profile['tiered_stop_at_level']))
+    args.extend(profile.get('extra_flags') or [])
+    return args
@@ -25,9 +25,10 @@ import sublime_plugin
 import os
 import subprocess
 from .event_hub import EventHub
-from .client import Client
+from .client import Client, EXIT_STDERR_LINES
 import threading
 import json
+import time
 from collections import OrderedDict
 from urllib.parse import urljoin
 from urllib.parse import urlparse
@@ -36,7 +37,47 @@ from urllib.request import url2pathname
 from .request import Request
 from .notification import Notification
 from .util import util
+from . import daemon
+from . import jvm
+from .index_cache import prepare_apex_db, apex_db_path, fingerprint_sources, save_fingerprint
+from .startup import StartupTimings, EventQueue
+from .watchdog import ResourceSampler
+from .debounce import ChangeScheduler
+from .completion_cache import CompletionCache
+from . import apex_index
+from .text_changes import ChangeTracker, content_change, content_hash, sync_kind, TEXT_SYNC_INCREMENTAL
 client = None
+startup_timings = StartupTimings()
+queued_events = EventQueue()
+server_initialized = False
+startup_state = 'idle'
+startup_lock = threading.Lock()
+RESTART_BASE_DELAY = 1
+RESTART_MAX_DELAY = 60
+# A server that ran at least this long resets the restart backoff
+RESTART_STABLE_AFTER = 120
+restart_stats = {
+    "restarts": 0,
+    "consecutive_failures": 0,
+    "last_exit_code": None,
+    "last_stderr": [],
+    "last_exit": None,
+    "down_since": None,
+    "downtime": 0.0
+}
+# Never recycle a server younger than this, even when it is over the limits
+RECYCLE_MIN_UPTIME = 600
+STATS_STATUS_INTERVAL = 2000
+STATS_STATUS_KEY = 'dxmate_lsp'
+stats_status_running = False
+resource_sampler = None  # type: Optional[ResourceSampler]
+watchdog_running = False
+recycle_reason = None
+recycle_stats = {
+    "recycles": 0,
+    "last_reason": None,
+    "last_recycle": None
+}
 
 
 # TODO: this should be per-window ?
@@ -48,12 +89,51 @@ class DocumentState:
     def __init__(self, path: str) -> 'None':
         self.path = path
         self.version = 0
+        self.content_hash = None  # type: Optional[Tuple[int, int]]
+        # Newly opened: nothing known about an earlier document at this path holds
+        EventHub.publish('document.version', path, None)
 
     def inc_version(self):
         self.version += 1
+        EventHub.publish('document.version', self.path, self.version)
         return self.version
 
 
+change_tracker = ChangeTracker()
+sync_stats = {
+    "suppressed_changes": 0,
+    "suppressed_bytes": 0
+}
+text_sync_kind = None
+# Incremental changes are only checked for leaving the text as it was in
+# buffers up to this size, as that means reading and hashing all of it
+DEDUP_MAX_SIZE = 64 * 1024
+
+
+def read_text(view: sublime.View) -> str:
+    """Reads the whole buffer and tells the change tracker which edit it reflects"""
+    for attempt in range(3):
+        change_count = view.change_count()
+        text = view.substr(sublime.Region(0, view.size()))
+        if view.change_count() == change_count:
+            change_tracker.synced(view.buffer_id(), change_count)
+            return text
+    change_tracker.synced(view.buffer_id(), None)
+    return text
+
+
+def record_text_changes(buffer, changes):
+    """Keeps the edits of Apex buffers while the server syncs incrementally"""
+    if text_sync_kind != TEXT_SYNC_INCREMENTAL:
+        return
+    view = buffer.primary_view()
+    if not view or not util.is_apex_file(view):
+        return
+    change_tracker.record(buffer.id(), view.change_count(), [
+        content_change(change.a.row, change.a.col_utf16, change.b.row, change.b.col_utf16, change.str)
+        for change in changes])
+
+
 def get_document_state(path: str) -> DocumentState:
     if path not in document_states:
         document_states[path] = DocumentState(path)
@@ -63,12 +143,14 @@ def notify_did_open(view: sublime.View):
     if client and view and view.file_name() and util.is_apex_file(view):
         view.settings().set("show_definitions", False)
         if view.file_name() not in document_states:
-            get_document_state(view.file_name())
+            document_state = get_document_state(view.file_name())
+            text = read_text(view)
+            document_state.content_hash = content_hash(text)
             params = {
                 "textDocument": {
                     "uri": util.filename_to_uri(view.file_name()),
                     "languageId": 'apex',
-                    "text": view.substr(sublime.Region(0, view.size()))
+                    "text": text
                 }
             }
             client.send_notification(Notification.didOpen(params))
@@ -77,6 +159,8 @@ def notify_did_open(view: sublime.View):
 def notify_did_close(view: sublime.View):
     if util.is_apex_file(view) and view.file_name() in document_states:
         del document_states[view.file_name()]
+        change_tracker.forget(view.buffer_id())
+        change_scheduler.discard(view.buffer_id())
         if client:
             params = {"textDocument": {"uri": util.filename_to_uri(view.file_name())}}
             client.send_notification(Notification.didClose(params))
@@ -90,42 +174,67 @@ def notify_did_save(view: sublime.View):
     else:
         util.debug('document not tracked', view.file_name())
 
-pending_buffer_changes = dict()  # type: Dict[int, Dict]
+def purge_did_change(buffer_id: int):
+    """Sends the buffer's pending changes right away, e.g. before a completion"""
+    change_scheduler.flush(buffer_id)
 
 
-def purge_did_change(buffer_id: int, buffer_version=None):
-    if buffer_id not in pending_buffer_changes:
-        return
+def queue_did_change(view: sublime.View):
+    change_scheduler.schedule(view.buffer_id(), view, view.size())
 
-    pending_buffer = pending_buffer_changes.get(buffer_id)
 
-    if pending_buffer:
-        if buffer_version is None or buffer_version == pending_buffer["version"]:
-            notify_did_change(pending_buffer["view"])
+completion_cache = CompletionCache()
+change_scheduler = ChangeScheduler(sublime.set_timeout_async, lambda view: notify_did_change(view))
+# Requests that must see the current text, so pending changes are sent first
+FRESH_CONTENT_METHODS = (
+    "textDocument/completion",
+    "textDocument/hover",
+    "textDocument/signatureHelp",
+    "textDocument/definition",
+    "textDocument/references"
+)
+
+
+def send_document_request(view: sublime.View, request: Request, handler=None, on_timeout=None):
+    """Sends a request about view, flushing its pending changes first if needed"""
+    if not client:
+        return None
+    if request.method in FRESH_CONTENT_METHODS:
+        purge_did_change(view.buffer_id())
+    return client.send_request(request, handler, on_timeout)
 
-def queue_did_change(view: sublime.View):
-    buffer_id = view.buffer_id()
-    buffer_version = 1
-    pending_buffer = None
-    if buffer_id in pending_buffer_changes:
-        pending_buffer = pending_buffer_changes[buffer_id]
-        buffer_version = pending_buffer["version"] + 1
-        pending_buffer["version"] = buffer_version
-    else:
-        pending_buffer_changes[buffer_id] = {
-            "view": view,
-            "version": buffer_version
-        }
-        
-    sublime.set_timeout_async(
-        lambda: purge_did_change(buffer_id, buffer_version), 500)
+
+def handle_diagnostics_latency(params):
+    change_scheduler.diagnostics_received(params.get("uri"))
 
 
 def notify_did_change(view: sublime.View):
-    if util.is_apex_file(view) and view.buffer_id() in pending_buffer_changes:
-        del pending_buffer_changes[view.buffer_id()]
-    if client:
+    if client and server_initialized:
         document_state = get_document_state(view.file_name())
+        changes = None
+        change_count = view.change_count()
+        if text_sync_kind == TEXT_SYNC_INCREMENTAL:
+            changes = change_tracker.take(view.buffer_id())
+            if changes == []:
+                return
+        if changes is None:
+            text = read_text(view)
+            changes = [{"text": text}]
+        elif view.size() <= DEDUP_MAX_SIZE:
+            text = view.substr(sublime.Region(0, view.size()))
+            if view.change_count() != change_count:
+                # Edited meanwhile: the text is newer than the changes
+                text = None
+        else:
+            text = None
+        if text is not None:
+            new_hash = content_hash(text)
+            if new_hash == document_state.content_hash:
+                suppress_did_change(changes)
+                return
+            document_state.content_hash = new_hash
+        else:
+            document_state.content_hash = None
         uri = util.filename_to_uri(view.file_name())
         params = {
             "textDocument": {
@@ -133,29 +242,60 @@ def notify_did_change(view: sublime.View):
                 # "languageId": config.languageId, clangd does not like this field, but no server uses it?
                 "version": document_state.inc_version(),
             },
-            "contentChanges": [{
-                "text": view.substr(sublime.Region(0, view.size()))
-            }]
+            "contentChanges": changes
         }
         client.send_notification(Notification.didChange(params))
+        change_scheduler.change_sent(uri)
+
 
 
+def suppress_did_change(changes):
+    """Skips a didChange that would leave the server's text as it is"""
+    sync_stats["suppressed_changes"] += 1
+    sync_stats["suppressed_bytes"] += sum(len(change["text"]) for change in changes)
+
 
 document_sync_initialized = False
-def initialize_document_sync(text_document_sync_kind):
+def initialize_document_sync(text_document_sync):
     global document_sync_initialized
+    global text_sync_kind
+    text_sync_kind = sync_kind(text_document_sync)
+    util.debug('text document sync kind', text_sync_kind)
+    change_scheduler.configure(util.get_setting('did_change_min_delay'),
+                               util.get_setting('did_change_max_delay'))
+    completion_cache.configure(util.get_setting('completion_cache_size'),
+                               util.get_setting('completion_cache_ttl'))
     if document_sync_initialized:
         return
     document_sync_initialized = True
     # TODO: hook up events per scope/client
-    EventHub.subscribe('on_load_async', notify_did_open)
-    EventHub.subscribe('on_activated_async', notify_did_open)
-    EventHub.subscribe('on_modified_async', queue_did_change)
-    EventHub.subscribe('on_post_save_async', notify_did_save)
-    EventHub.subscribe('on_close', notify_did_close)
+    for event_name, handler in document_sync_handlers().items():
+        EventHub.subscribe(event_name, when_initialized(handler))
+
+
+def when_initialized(handler):
+    """Runs handler only once the server answered initialize.
 
+    While a replacement server starts the events are queued instead, see
+    queue_until_initialized, so nothing is sent before initialize.
+    """
+    def gated(view):
+        if server_initialized:
+            handler(view)
+    return gated
 
-didopen_after_initialize = False
+
+def document_sync_handlers():
+    return OrderedDict([
+        ('on_load_async', notify_did_open),
+        ('on_activated_async', notify_did_open),
+        ('on_modified_async', queue_did_change),
+        ('on_post_save_async', notify_did_save),
+        ('on_close', notify_did_close)
+    ])
+
+
+didopen_after_initialize = []
 
 def handle_initialize_result(result, client, window, config):
     global didopen_after_initialize
@@ -180,6 +320,12 @@ def handle_initialize_result(result, client, window, config):
 
 def handle_initialize_result(result, client):
     global didopen_after_initialize
+    global server_initialized
+    startup_timings.end()
+    report_initialize_time(client)
+    if restart_stats["down_since"]:
+        restart_stats["downtime"] += time.time() - restart_stats["down_since"]
+        restart_stats["down_since"] = None
     capabilities = result.get("capabilities")
     client.set_capabilities(capabilities)
     document_sync = capabilities.get("textDocumentSync")
@@ -187,24 +333,65 @@ def handle_initialize_result(result, client):
 
     for view in didopen_after_initialize:
         notify_did_open(view)
+    sync_open_documents()
+    server_initialized = True
+    replay_queued_events()
     util.debug('init complete')
     didopen_after_initialize = list()
 
 
-def deleteDbIfExists():
+def report_initialize_time(client):
+    """Shows how long the server took from spawn to answering initialize"""
+    client.initialize_time = time.time() - client.started_at
+    if client.launch_info.get("attached"):
+        message = "DXMate: attached to running language server in {:.1f}s".format(
+            client.initialize_time)
+    else:
+        message = "DXMate: language server ready in {:.1f}s (profile: {}, class data sharing: {})".format(
+            client.initialize_time, client.launch_info.get("profile"), client.launch_info.get("cds"))
+    util.debug(message)
+    sublime.status_message(message)
+
+
+def sync_open_documents():
+    """Sends didOpen for every Apex file already open in a window.
+
+    After attaching to a running server, or starting a new one, the server
+    knows nothing about what is open in the editor.
+    """
+    for window in sublime.windows():
+        for view in window.views():
+            notify_did_open(view)
+
+
+def prepareApexDb():
+    """Reuses the Apex index from the last run when the sources still match it"""
+    startup_timings.begin('prepare_apex_db')
     try:
         dx_folder = util.dxProjectFolder()
         if len(dx_folder) > 0:
-            db_path = os.path.join(dx_folder, '.sfdx', 'tools', 'apex.db')
-            if os.path.isfile(db_path):
-                os.remove(db_path)
-                util.debug('db deleted')
+            action, changed = prepare_apex_db(
+                dx_folder,
+                reuse=util.get_setting('reuse_apex_db'),
+                max_changed=util.get_setting('apex_db_max_changed_files') or 0,
+                use_content=util.get_setting('apex_db_fingerprint') == 'content')
+            util.debug('apex db', action, 'changed files:', changed)
     except Exception as e:
-        util.debug("db not deleted")
+        util.debug("could not prepare apex db", e)
 
 
-def start_server():
-    deleteDbIfExists()
+def saveApexDbFingerprint():
+    """Records the sources the index reflects, once the server acknowledged shutdown"""
+    try:
+        dx_folder = util.dxProjectFolder()
+        use_content = util.get_setting('apex_db_fingerprint') == 'content'
+        if len(dx_folder) > 0 and os.path.isfile(apex_db_path(dx_folder)):
+            save_fingerprint(dx_folder, fingerprint_sources(dx_folder, use_content), use_content)
+    except Exception as e:
+        util.debug("could not save apex db fingerprint", e)
+
+
+def server_args():
     working_dir = os.path.join(util.get_plugin_folder(), 'apex-jorje-lsp.jar')
     java_cmd = 'java'
     java_path = util.get_setting('java_path')
@@ -213,14 +400,67 @@ def start_server():
         java_cmd = os.path.join(java_path, java_cmd)
 
     util.debug('using java path: ', java_cmd)
-    args = [java_cmd, '-cp', working_dir, '-Ddebug.internal.errors=true','-Ddebug.semantic.errors=false',
+    server_command = util.get_setting('server_command')
+    if server_command:
+        variables = {
+            "packages": sublime.packages_path(),
+            "plugin_folder": util.get_plugin_folder()
+        }
+        args = [sublime.expand_variables(arg, variables) for arg in server_command]
+        return args, {"profile": "server_command"}
+
+    startup_timings.begin('jvm_args')
+    profile_name = util.get_setting('jvm_profile') or 'default'
+    profile = (util.get_setting('jvm_profiles') or {}).get(profile_name, {})
+    launch_info = {"profile": profile_name, "cds": "off"}
+    jvm_args = jvm.profile_args(profile)
+    if util.get_setting('class_data_sharing'):
+        cds_args, launch_info["cds"] = jvm.cds_args(
+            java_cmd, working_dir, os.path.join(sublime.cache_path(), util.plugin_name()),
+            startupinfo())
+        jvm_args += cds_args
+    args = [java_cmd] + jvm_args + ['-cp', working_dir, '-Ddebug.internal.errors=true','-Ddebug.semantic.errors=false',
             'apex.jorje.lsp.ApexLanguageServerLauncher']
-    util.debug("starting " + str(args))
+    return args, launch_info
+
+
+def startupinfo():
     si = None
     if os.name == "nt":
         si = subprocess.STARTUPINFO()  # type: ignore
         si.dwFlags |= subprocess.SW_HIDE | subprocess.STARTF_USESHOWWINDOW  # type: ignore
+    return si
+
+
+def start_daemon_process(args, launch_info, startupinfo):
+    """Attaches to the project's running server, starting one if needed"""
+    dx_folder = util.dxProjectFolder()
+    process = daemon.connect(dx_folder)
+    if process:
+        util.debug('attached to running language server', process.pid)
+        launch_info["attached"] = True
+        return process
+    prepareApexDb()
+    util.debug("starting daemon for " + str(args))
+    startup_timings.begin('spawn')
+    return daemon.spawn(dx_folder,
+                        util.get_setting('daemon_python') or daemon.default_python(),
+                        args,
+                        util.get_setting('daemon_idle_timeout') or 0,
+                        startupinfo)
+
+
+def start_server():
+    si = startupinfo()
     try:
+        args, launch_info = server_args()
+        if util.get_setting('daemon_mode'):
+            process = start_daemon_process(args, launch_info, si)
+            return start_client_for(process, launch_info) if process else None
+
+        prepareApexDb()
+        util.debug("starting " + str(args))
+        startup_timings.begin('spawn')
         process = subprocess.Popen(
             args,
             stdin=subprocess.PIPE,
@@ -228,21 +468,52 @@ def start_server():
             stderr=subprocess.PIPE,
             cwd=util.dxProjectFolder(),
             startupinfo=si)
-        return Client(process)
+        return start_client_for(process, launch_info)
 
     except Exception as err:
         util.debug(err)
 
+def start_client_for(process, launch_info):
+    new_client = Client(process, on_exit=handle_server_exit)
+    new_client.launch_info = launch_info
+    return new_client
+
+
 def get_client():
     global client
     return client
 
+
+stdlib_index = None  # type: Optional[apex_index.ApexIndex]
+
+
+def load_stdlib_index():
+    """Maps the offline index of the standard Apex classes, building it if needed"""
+    global stdlib_index
+    if not util.get_setting('offline_stdlib_index') or stdlib_index:
+        return
+    source = os.path.join(util.get_plugin_folder(), 'sublime', 'apex', 'stdlib.json')
+    index_path = os.path.join(sublime.cache_path(), util.plugin_name(), 'apex-stdlib.idx')
+    try:
+        stdlib_index = apex_index.open_index(source, index_path)
+        util.debug('apex stdlib index:', stdlib_index.count, 'symbols')
+    except (IOError, OSError, ValueError) as e:
+        util.debug('could not load apex stdlib index', e)
+
+
+def get_stdlib_index():
+    return stdlib_index
+
 def start_client():
     global client
+    global server_initialized
+    server_initialized = False
     client = start_server()
     if not client:
+        startup_timings.end()
         util.debug("Could not start language server")
         return
+    startup_timings.begin('initialize')
     initializeParams = {
         "processId": client.process.pid,
         "rootPath": util.dxProjectFolder(),
@@ -266,14 +537,255 @@ def start_client():
 
 
 
+def begin_startup():
+    """Starts the staged startup pipeline; returns without blocking.
+
+    The project is detected off the main thread. The server is then
+    started right away when start_server_eagerly is set or an Apex file
+    is already active, otherwise when the first Apex view is activated.
+    Editor events for Apex views are queued until initialize completes.
+    """
+    global startup_state
+    startup_timings.reset()
+    startup_state = 'detecting'
+    if not watchdog_running:
+        watch_server()
+    if not stats_status_running:
+        update_stats_status()
+    sublime.set_timeout_async(load_stdlib_index, 0)
+    sublime.set_timeout_async(detect_project, 0)
+
+
+def detect_project():
+    global startup_state
+    startup_timings.begin('detect_project')
+    folder = util.dxProjectFolder()
+    startup_timings.end()
+    if folder == '':
+        startup_state = 'no_project'
+        return
+    EventHub.publish('project.detected', folder)
+    window = sublime.active_window()
+    active_view = window.active_view() if window else None
+    if util.get_setting('start_server_eagerly') or util.is_apex_file(active_view):
+        start_client_once()
+    else:
+        startup_state = 'waiting'
+        startup_timings.begin('wait_for_apex_view')
+
+
+def handle_server_exit(exited_client):
+    """Restarts the server with exponential backoff when it dies unexpectedly"""
+    global client
+    global server_initialized
+    global startup_state
+    if exited_client is not client or exited_client.stopping:
+        return
+    now = time.time()
+    if now - exited_client.started_at >= RESTART_STABLE_AFTER:
+        restart_stats["consecutive_failures"] = 0
+    restart_stats["last_exit_code"] = exited_client.exit_code()
+    restart_stats["last_stderr"] = exited_client.get_stderr(EXIT_STDERR_LINES)
+    restart_stats["last_exit"] = now
+    restart_stats["down_since"] = now
+    client = None
+    server_initialized = False
+    util.debug("language server exited with code", restart_stats["last_exit_code"])
+    schedule_restart()
+
+
+def schedule_restart():
+    global startup_state
+    if not util.get_setting('restart_on_crash'):
+        startup_state = 'failed'
+        sublime.status_message("DXMate: language server exited")
+        return
+    max_attempts = util.get_setting('restart_max_attempts')
+    if max_attempts and restart_stats["consecutive_failures"] >= max_attempts:
+        startup_state = 'failed'
+        sublime.status_message("DXMate: language server keeps exiting, giving up after {} restarts".format(
+            restart_stats["consecutive_failures"]))
+        return
+    delay = min(RESTART_BASE_DELAY * 2 ** restart_stats["consecutive_failures"], RESTART_MAX_DELAY)
+    restart_stats["consecutive_failures"] += 1
+    startup_state = 'restarting'
+    sublime.status_message("DXMate: language server exited, restarting in {}s".format(delay))
+    sublime.set_timeout_async(restart_client, int(delay * 1000))
+
+
+def restart_client():
+    """Starts a new server; open documents are sent again once it is initialized"""
+    if startup_state != 'restarting':
+        return
+    restart_stats["restarts"] += 1
+    replace_client()
+
+
+def replace_client():
+    """Starts a new server in place of one that is gone"""
+    global startup_state
+    document_states.clear()
+    change_scheduler.clear()
+    completion_cache.clear()
+    change_tracker.clear()
+    startup_timings.reset()
+    startup_state = 'starting'
+    start_client()
+    if client:
+        startup_state = 'running'
+    else:
+        schedule_restart()
+
+
+def server_restart_stats():
+    stats = dict(restart_stats)
+    if stats["down_since"]:
+        stats["downtime"] += time.time() - stats["down_since"]
+    return stats
+
+
+def watch_server():
+    """Samples the server's resources every watchdog_interval seconds"""
+    global watchdog_running
+    interval = util.get_setting('watchdog_interval') or 0
+    if not interval:
+        watchdog_running = False
+        return
+    watchdog_running = True
+    sublime.set_timeout_async(watch_server, int(interval * 1000))
+    try:
+        check_server_resources()
+    except Exception as e:
+        util.debug("watchdog:", e)
+
+
+def check_server_resources():
+    """Recycles the server in an idle moment once it crosses the configured limits"""
+    global resource_sampler
+    global recycle_reason
+    current = client
+    if not current or current.stopping or not server_initialized or not current.process.pid:
+        return
+    if resource_sampler is None or resource_sampler.pid != current.process.pid:
+        resource_sampler = ResourceSampler(current.process.pid)
+        recycle_reason = None
+    if resource_sampler.sample() is None:
+        return
+    if recycle_reason is None and time.time() - current.started_at >= RECYCLE_MIN_UPTIME:
+        recycle_reason = resource_sampler.over_limits(
+            util.get_setting('watchdog_max_rss_mb') or 0,
+            util.get_setting('watchdog_max_cpu_percent') or 0,
+            max(1, util.get_setting('watchdog_cpu_samples') or 1))
+    idle_for = util.get_setting('watchdog_idle_seconds') or 0
+    if recycle_reason and len(current.handlers) == 0 and time.time() - current.last_sent >= idle_for:
+        recycle_server(recycle_reason)
+
+
+def recycle_server(reason):
+    """Replaces the running server with a fresh one.
+
+    The old server is asked to shut down normally; the new one is started
+    once it is gone, and gets didOpen for every open document.
+    """
+    global client
+    global server_initialized
+    global startup_state
+    global recycle_reason
+    old_client = client
+    if not old_client:
+        return
+    util.debug("recycling language server:", reason)
+    sublime.status_message("DXMate: restarting language server ({})".format(reason))
+    recycle_stats["recycles"] += 1
+    recycle_stats["last_reason"] = reason
+    recycle_stats["last_recycle"] = time.time()
+    recycle_reason = None
+    client = None
+    server_initialized = False
+    startup_state = 'recycling'
+    old_client.on_exit = lambda exited_client: sublime.set_timeout_async(replace_client, 0)
+    old_client.shutdown(stop_daemon=True, on_shutdown=saveApexDbFingerprint)
+
+
+def server_resource_stats():
+    stats = resource_sampler.stats() if resource_sampler else {'samples': 0}
+    stats.update(recycle_stats)
+    stats["pending_recycle"] = recycle_reason
+    return stats
+
+
+def update_stats_status():
+    """Shows in-flight requests, queue depth and completion p95 in the status bar"""
+    global stats_status_running
+    if not util.get_setting('lsp_stats_status_bar'):
+        stats_status_running = False
+        return
+    stats_status_running = True
+    sublime.set_timeout(update_stats_status, STATS_STATUS_INTERVAL)
+    window = sublime.active_window()
+    view = window.active_view() if window else None
+    if view:
+        view.set_status(STATS_STATUS_KEY, stats_status_text())
+
+
+def stats_status_text():
+    current = client
+    if not current:
+        return 'LSP: ' + startup_state
+    text = 'LSP: {} in flight, queue {}'.format(len(current.handlers), current.writer.queue.qsize())
+    completion = current.handlers.histograms.get('textDocument/completion')
+    if completion and completion.count:
+        text += ', completion p95 {:.0f}ms'.format(completion.percentile(95))
+    return text
+
+
+def start_client_once():
+    global startup_state
+    with startup_lock:
+        if startup_state in ('starting', 'running'):
+            return
+        startup_state = 'starting'
+    start_client()
+    startup_state = 'running' if client else 'failed'
+
+
+def start_on_apex_view(view):
+    if startup_state == 'waiting' and util.is_apex_file(view):
+        sublime.set_timeout_async(start_client_once, 0)
+
+
+def queue_until_initialized(event_name):
+    def handler(view):
+        if not server_initialized and util.is_apex_file(view):
+            queued_events.add(event_name, view)
+    return handler
+
+
+def replay_queued_events():
+    """Runs the document sync handlers for events held back during startup.
+
+    Views closed in the meantime were never opened in the server, so
+    their events are dropped.
+    """
+    handlers = document_sync_handlers()
+    for event_name, view in queued_events.drain():
+        if view.is_valid():
+            handlers[event_name](view)
+
+
 def handle_close(window, *args):
     if util.dxProjectFolder() == '' and client:
-        client.kill()
+        client.shutdown(on_shutdown=saveApexDbFingerprint if server_initialized else None)
 
 def handle_exit(window, *args):
     if client:
-        client.kill()
+        client.shutdown(on_shutdown=saveApexDbFingerprint if server_initialized else None)
 
+for event_name in document_sync_handlers():
+    EventHub.subscribe(event_name, queue_until_initialized(event_name))
+EventHub.subscribe('on_activated_async', start_on_apex_view)
+EventHub.subscribe('on_text_changed', record_text_changes)
+EventHub.subscribe('document.diagnostics', handle_diagnostics_latency)
 EventHub.subscribe('exit', handle_exit)
 EventHub.subscribe('close_window', handle_close)
 EventHub.subscribe('on_pre_close', handle_close)
\ No newline at end of file
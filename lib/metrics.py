@@ -0,0 +1,114 @@
+"""
+Lightweight latency and counter bookkeeping for the language server client.
+
+Standard library only, so it can be used from the benchmarks as well.
+"""
+
+import bisect
+import time
+
+# Upper bounds of the histogram buckets in milliseconds; the last bucket
+# catches everything slower.
+LATENCY_BUCKETS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 350, 500, 750,
+    1000, 1500, 2000, 3000, 5000, 10000, 30000, 60000
+)
+
+
+class LatencyHistogram(object):
+    """Fixed bucket histogram of latencies in milliseconds"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Returns the upper bound of the bucket holding the p-th percentile"""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                if index < len(self.buckets):
+                    return min(float(self.buckets[index]), self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.mean(),
+            "max_ms": self.max,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99)
+        }
+
+
+class RateCounter(object):
+    """Counts events by name and reports their rate since the last read"""
+
+    def __init__(self):
+        self.counts = {}  # type: Dict[str, int]
+        self.last_read = time.time()
+        self.last_counts = {}  # type: Dict[str, int]
+
+    def add(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def rates(self):
+        """Returns events per second for each name since the previous call"""
+        now = time.time()
+        counts = dict(self.counts)
+        elapsed = max(now - self.last_read, 1e-6)
+        rates = dict((name, (count - self.last_counts.get(name, 0)) / elapsed)
+                     for name, count in counts.items())
+        self.last_read = now
+        self.last_counts = counts
+        return rates
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "{}:{:02}:{:02}".format(hours, minutes, seconds)
+
+
+def format_client_stats(stats):
+    """Renders Client.get_stats() as an aligned plain text table"""
+    lines = [
+        "uptime        {}".format(format_duration(stats["uptime"])),
+        "in flight     {}".format(stats["in_flight"]),
+        "queue depth   {} (dropped {})".format(stats["writer"]["queue_depth"], stats["writer"]["dropped"]),
+        "bytes in/out  {:.1f} MB / {:.1f} MB".format(stats["bytes_in"] / 1e6, stats["writer"]["bytes"] / 1e6),
+        "writes        {:.2f} ms avg queued, {:.2f} ms max write".format(
+            stats["writer"]["avg_latency_ms"], stats["writer"]["max_write_ms"]),
+        "",
+        "{:<36}{:>7}{:>8}{:>9}{:>9}{:>9}".format("request", "sent", "timeout", "p50 ms", "p95 ms", "p99 ms")
+    ]
+    for method in sorted(stats["requests"]):
+        request = stats["requests"][method]
+        lines.append("{:<36}{:>7}{:>8}{:>9.0f}{:>9.0f}{:>9.0f}".format(
+            method, request["sent"], request["timed_out"],
+            request["p50_ms"], request["p95_ms"], request["p99_ms"]))
+    if stats["inbound"] is not None:
+        lines.extend(["", "{:<36}{:>7}{:>10}".format("inbound", "count", "per sec")])
+        for method in sorted(stats["inbound"]):
+            count, rate = stats["inbound"][method]
+            lines.append("{:<36}{:>7}{:>10.1f}".format(method, count, rate))
+    return "\n".join(lines)
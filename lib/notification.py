@@ -45,6 +45,10 @@ class Notification:
     def didClose(cls, params):
         return Notification("textDocument/didClose", params)
 
+    @classmethod
+    def cancelRequest(cls, params):
+        return Notification("$/cancelRequest", params)
+
     @classmethod
     def exit(cls):
         return Notification("exit", None)
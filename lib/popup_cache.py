@@ -0,0 +1,86 @@
+"""
+LRU cache of popup HTML rendered from markdown, bounded by size.
+
+Rendering markdown with mdpopups parses it and runs Pygments over every
+code block, which is noticeable for long messages shown on every
+mouse-over. The rendered HTML only depends on the markdown and the
+colour scheme, so it is kept, up to budget bytes of markdown and HTML.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class RenderCache(object):
+
+    def __init__(self, budget=2 * 1024 * 1024):
+        self.budget = budget
+        self.entries = OrderedDict()  # type: OrderedDict[Tuple[str, str], str]
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def cost(key, html):
+        return len(key[0]) + len(html)
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        cost = self.cost(key, html)
+        if cost > self.budget:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.used -= self.cost(key, previous)
+            self.entries[key] = html
+            self.used += cost
+            self.evict()
+
+    def evict(self):
+        """Drops the least recently used entries until within budget; holds the lock"""
+        while self.used > self.budget and self.entries:
+            old_key, old_html = self.entries.popitem(last=False)
+            self.used -= self.cost(old_key, old_html)
+            self.evictions += 1
+
+    def render(self, key, render):
+        """Returns the HTML for key, calling render() to produce it on a miss"""
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.put(key, html)
+        return html
+
+    def configure(self, budget):
+        with self.lock:
+            self.budget = budget
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.used,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
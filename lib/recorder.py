@@ -0,0 +1,53 @@
+"""
+Recording of the JSON-RPC traffic between DXMate and the language server.
+
+A recording is a flat file of records, each a fixed header (timestamp as
+a double, direction byte, body length) followed by the raw message body.
+Standard library only, so recordings can be replayed outside of Sublime
+(see benchmarks/replay_server.py).
+"""
+
+import struct
+import threading
+import time
+
+INBOUND = 0
+OUTBOUND = 1
+RECORD_HEADER = struct.Struct("<dBI")
+
+
+class TrafficRecorder(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        self.lock = threading.Lock()
+        self.records = 0
+
+    def record(self, direction, body):
+        header = RECORD_HEADER.pack(time.time(), direction, len(body))
+        with self.lock:
+            if self.file:
+                self.file.write(header)
+                self.file.write(body)
+                self.records += 1
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def read_recording(path):
+    """Yields (timestamp, direction, body) for every record in a file"""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, direction, length = RECORD_HEADER.unpack(header)
+            body = f.read(length)
+            if len(body) < length:
+                return
+            yield timestamp, direction, body
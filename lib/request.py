@@ -33,6 +33,10 @@ class Request:
     def initialize(cls, params):
         return Request("initialize", params)
 
+    @classmethod
+    def shutdown(cls):
+        return Request("shutdown", None)
+
     @classmethod
     def hover(cls, params):
         return Request("textDocument/hover", params)
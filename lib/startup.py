@@ -0,0 +1,79 @@
+"""
+Bookkeeping for the staged language server startup.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class StartupTimings(object):
+    """Records how long each startup stage took, in order"""
+
+    def __init__(self):
+        self.stages = OrderedDict()  # type: OrderedDict[str, float]
+        self.started = None
+        self.current = None
+        self.current_started = None
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.started = time.time()
+            self.current = None
+
+    def begin(self, stage):
+        """Starts timing stage, ending the stage before it"""
+        now = time.time()
+        with self.lock:
+            self.end_current(now)
+            self.current = stage
+            self.current_started = now
+
+    def end(self):
+        with self.lock:
+            self.end_current(time.time())
+            self.current = None
+
+    def end_current(self, now):
+        if self.current:
+            self.stages[self.current] = now - self.current_started
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def format(self):
+        lines = ["{:<24}{:>9.3f}s".format(stage, seconds)
+                 for stage, seconds in self.stages.items()]
+        if self.current:
+            lines.append("{:<24}{:>10}".format(self.current, "running"))
+        lines.append("{:<24}{:>9.3f}s".format("total", self.total()))
+        return "\n".join(lines)
+
+
+class EventQueue(object):
+    """Holds editor events for Apex views until the server is initialized.
+
+    Repeated events of the same kind for the same view are collapsed, so a
+    burst of modifications replays as one.
+    """
+
+    def __init__(self):
+        self.events = OrderedDict()  # type: OrderedDict[Tuple[str, int], Tuple]
+        self.lock = threading.Lock()
+
+    def add(self, event_name, view):
+        key = (event_name, view.id())
+        with self.lock:
+            self.events.pop(key, None)
+            self.events[key] = (event_name, view)
+
+    def drain(self):
+        with self.lock:
+            events = list(self.events.values())
+            self.events.clear()
+        return events
+
+    def __len__(self):
+        return len(self.events)
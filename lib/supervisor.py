@@ -0,0 +1,228 @@
+"""
+Supervisor keeping the language server running across plugin reloads.
+
+This file is not imported by the plugin. It runs as its own process:
+
+    python3 supervisor.py --state-file <file> --cwd <project> -- java ...
+
+It starts the language server and relays it to one DXMate connection at
+a time over a localhost socket, described (port, token, pids) in the
+state file. When the plugin reloads it disconnects and reattaches
+instead of paying for a new JVM and index:
+
+  * the first initialize is forwarded; later ones are answered with the
+    cached result, and only the first initialized is forwarded
+  * request ids are remapped so responses to a previous connection never
+    reach the current one
+  * documents a connection opened are closed for it when it goes away,
+    so the next connection can didOpen them again
+  * an exit notification stops the server and the supervisor; without a
+    connection for --idle-timeout seconds it stops by itself
+"""
+
+import argparse
+import binascii
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+
+from framing import FrameReader, encode_payload, READ_CHUNK_SIZE
+
+
+class Supervisor(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.RLock()
+        self.connection = None
+        self.last_disconnect = time.time()
+        self.next_id = 0
+        self.pending = {}  # server id -> (connection, client id, method)
+        self.open_documents = set()
+        self.initialize_result = None
+        self.initialized_sent = False
+        self.token = binascii.hexlify(os.urandom(16)).decode("ascii")
+        log = open(args.log_file, "ab") if args.log_file else subprocess.DEVNULL
+        self.server = subprocess.Popen(args.command, cwd=args.cwd, stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE, stderr=log)
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(1)
+
+    def write_state(self):
+        state = {
+            "pid": os.getpid(),
+            "server_pid": self.server.pid,
+            "port": self.listener.getsockname()[1],
+            "token": self.token,
+            "cwd": self.args.cwd,
+            "started": time.time()
+        }
+        with open(self.args.state_file + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(self.args.state_file + ".tmp", self.args.state_file)
+
+    def remove_state(self):
+        try:
+            with open(self.args.state_file) as f:
+                if json.load(f).get("pid") == os.getpid():
+                    os.remove(self.args.state_file)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def to_server(self, message):
+        header, body = encode_payload(message)
+        self.server.stdin.write(header)
+        self.server.stdin.write(body)
+        self.server.stdin.flush()
+
+    def to_client(self, connection, message):
+        header, body = encode_payload(message)
+        try:
+            connection.sendall(header + body)
+        except OSError:
+            pass
+
+    def on_client_message(self, connection, body):
+        message = json.loads(body.decode("UTF-8"))
+        method = message.get("method")
+        with self.lock:
+            if method == "exit":
+                self.stop()
+            elif method == "initialize" and self.initialize_result is not None:
+                self.to_client(connection, {"jsonrpc": "2.0", "id": message["id"],
+                                            "result": self.initialize_result})
+                return
+            elif method == "initialized":
+                if self.initialized_sent:
+                    return
+                self.initialized_sent = True
+            elif method == "textDocument/didOpen":
+                self.open_documents.add(message["params"]["textDocument"]["uri"])
+            elif method == "textDocument/didClose":
+                self.open_documents.discard(message["params"]["textDocument"]["uri"])
+            elif method == "$/cancelRequest":
+                for server_id, pending in self.pending.items():
+                    if pending[0] is connection and pending[1] == message["params"]["id"]:
+                        message["params"]["id"] = server_id
+                        break
+
+            if method and "id" in message:
+                self.next_id += 1
+                self.pending[self.next_id] = (connection, message["id"], method)
+                message["id"] = self.next_id
+            self.to_server(message)
+
+    def on_server_message(self, body):
+        message = json.loads(body.decode("UTF-8"))
+        with self.lock:
+            if "method" not in message and message.get("id") is not None:
+                pending = self.pending.pop(message["id"], None)
+                if pending is None:
+                    return
+                connection, client_id, method = pending
+                if method == "initialize" and "result" in message:
+                    self.initialize_result = message["result"]
+                if connection is not self.connection:
+                    return
+                message["id"] = client_id
+            if self.connection:
+                self.to_client(self.connection, message)
+
+    def serve_connection(self, connection):
+        frames = FrameReader()
+        try:
+            if connection.recv(len(self.token) + 1).decode("ascii").strip() != self.token:
+                return
+            connection.sendall(b"ok\n")
+            with self.lock:
+                if self.connection:
+                    self.detach()
+                self.connection = connection
+            while True:
+                data = connection.recv(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                for body in frames.feed(data):
+                    self.on_client_message(connection, body)
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                if self.connection is connection:
+                    self.detach()
+            connection.close()
+
+    def detach(self):
+        """Closes everything the leaving connection had open in the server"""
+        self.connection = None
+        self.last_disconnect = time.time()
+        for uri in self.open_documents:
+            self.to_server({"jsonrpc": "2.0", "method": "textDocument/didClose",
+                            "params": {"textDocument": {"uri": uri}}})
+        self.open_documents.clear()
+
+    def read_server(self):
+        try:
+            FrameReader().read_from(self.server.stdout.fileno(), self.on_server_message)
+        finally:
+            self.remove_state()
+            os._exit(0)
+
+    def watch_idle(self):
+        while True:
+            time.sleep(10)
+            with self.lock:
+                idle = self.connection is None and \
+                    time.time() - self.last_disconnect > self.args.idle_timeout
+            if idle:
+                self.stop()
+
+    def stop(self):
+        try:
+            self.to_server({"jsonrpc": "2.0", "method": "exit"})
+        except (IOError, OSError):
+            pass
+        self.remove_state()
+        try:
+            self.server.wait(5)
+        except subprocess.TimeoutExpired:
+            self.server.kill()
+        os._exit(0)
+
+    def run(self):
+        self.write_state()
+        threading.Thread(target=self.read_server, daemon=True).start()
+        if self.args.idle_timeout:
+            threading.Thread(target=self.watch_idle, daemon=True).start()
+        while True:
+            connection, address = self.listener.accept()
+            with self.lock:
+                previous = self.connection
+            if previous:
+                try:
+                    previous.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DXMate language server supervisor")
+    parser.add_argument("--state-file", required=True)
+    parser.add_argument("--cwd", default=None)
+    parser.add_argument("--log-file", default=None)
+    parser.add_argument("--idle-timeout", type=float, default=1800,
+                        help="seconds without a connection before stopping, 0 for never")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.command and args.command[0] == "--":
+        args.command = args.command[1:]
+    Supervisor(args).run()
+
+
+if __name__ == '__main__':
+    main()
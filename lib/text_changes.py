@@ -0,0 +1,138 @@
+"""
+Edit history per buffer for incremental textDocument/didChange.
+
+Edits are recorded as LSP content changes as they happen, stamped with
+the buffer's change count. Whenever the full text of a buffer is sent
+(didOpen, or a full didChange) the tracker is told which change count
+that text reflects; everything recorded after it is what the next
+incremental didChange has to carry. Where the history can't be trusted
+(nothing was ever synced, too many edits piled up, or the text could
+not be read consistently) take() returns None and the caller falls back
+to sending the full text, which also resynchronises the tracker.
+"""
+
+import threading
+import zlib
+
+TEXT_SYNC_NONE = 0
+TEXT_SYNC_FULL = 1
+TEXT_SYNC_INCREMENTAL = 2
+
+# Past these, one full text is cheaper than replaying the edits
+MAX_PENDING_CHANGES = 1000
+MAX_PENDING_TEXT = 256 * 1024
+
+
+def sync_kind(text_document_sync):
+    """The change sync kind from a textDocumentSync capability (number or options)"""
+    if isinstance(text_document_sync, dict):
+        return text_document_sync.get("change") or TEXT_SYNC_NONE
+    return text_document_sync or TEXT_SYNC_NONE
+
+
+def content_change(start_line, start_character, end_line, end_character, text):
+    return {
+        "range": {
+            "start": {"line": start_line, "character": start_character},
+            "end": {"line": end_line, "character": end_character}
+        },
+        "text": text
+    }
+
+
+def content_hash(text):
+    """Cheap fingerprint of a document's text: (length, adler32)"""
+    return len(text), zlib.adler32(text.encode("utf-8"))
+
+
+def utf16_length(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def coalesce(changes):
+    """Merges runs of single line insertions that follow each other, i.e. typing"""
+    merged = []
+    for change in changes:
+        previous = merged[-1] if merged else None
+        if previous and "\n" not in previous["text"] and "\n" not in change["text"]:
+            start = previous["range"]["start"]
+            inserted_end = start["character"] + utf16_length(previous["text"])
+            at = change["range"]["start"]
+            if change["range"]["start"] == change["range"]["end"] and \
+                    at["line"] == start["line"] and at["character"] == inserted_end:
+                previous["text"] += change["text"]
+                continue
+        merged.append(dict(change, range=dict(change["range"])))
+    return merged
+
+
+class BufferChanges(object):
+
+    def __init__(self):
+        self.synced_count = None  # type: Optional[int]
+        self.batches = []  # type: List[Tuple[int, List[Dict]]]
+        self.changes = 0
+        self.size = 0
+
+
+class ChangeTracker(object):
+    """Records edits per buffer id; safe to feed from the main thread"""
+
+    def __init__(self):
+        self.buffers = {}  # type: Dict[int, BufferChanges]
+        self.lock = threading.Lock()
+
+    def record(self, buffer_id, change_count, changes):
+        with self.lock:
+            state = self.buffers.get(buffer_id)
+            if state is None:
+                state = self.buffers[buffer_id] = BufferChanges()
+            # Also drops edits the full text sent by synced() already had:
+            # the text may be read before on_text_changed reports them
+            if state.synced_count is None or change_count <= state.synced_count:
+                return
+            state.batches.append((change_count, changes))
+            state.changes += len(changes)
+            state.size += sum(len(change["text"]) for change in changes)
+            if state.changes > MAX_PENDING_CHANGES or state.size > MAX_PENDING_TEXT:
+                self.reset(state, None)
+
+    def synced(self, buffer_id, change_count):
+        """The full text as of change_count was sent; None when that is uncertain"""
+        with self.lock:
+            state = self.buffers.get(buffer_id)
+            if state is None:
+                state = self.buffers[buffer_id] = BufferChanges()
+            batches = [batch for batch in state.batches
+                       if change_count is not None and batch[0] > change_count]
+            self.reset(state, change_count)
+            for batch in batches:
+                state.batches.append(batch)
+                state.changes += len(batch[1])
+                state.size += sum(len(change["text"]) for change in batch[1])
+
+    def take(self, buffer_id):
+        """Returns the content changes since the last sync, or None if unknown"""
+        with self.lock:
+            state = self.buffers.get(buffer_id)
+            if state is None or state.synced_count is None:
+                return None
+            changes = [change for count, batch in state.batches for change in batch]
+            if state.batches:
+                self.reset(state, state.batches[-1][0])
+        return coalesce(changes)
+
+    def forget(self, buffer_id):
+        with self.lock:
+            self.buffers.pop(buffer_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.buffers.clear()
+
+    @staticmethod
+    def reset(state, synced_count):
+        state.synced_count = synced_count
+        state.batches = []
+        state.changes = 0
+        state.size = 0
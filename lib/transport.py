@@ -0,0 +1,259 @@
+"""
+Threads moving bytes between DXMate and the language server process.
+
+Like framing.py this only uses the standard library.
+"""
+
+import collections
+import os
+import queue
+import socket
+import threading
+import time
+try:
+    import selectors
+except ImportError:
+    selectors = None
+from .framing import FrameReader, READ_CHUNK_SIZE
+
+MAX_QUEUE_SIZE = 1024
+MAX_COALESCE_BYTES = 1024 * 1024
+MAX_STDERR_LINES = 500
+
+
+class MessageWriter(object):
+    """Writes encoded frames to a stream from a dedicated thread.
+
+    send() never blocks: frames go onto a queue and are written by the
+    writer thread, which writes whatever has queued up since its last
+    write into the stream's buffer and flushes once. Once max_queue_size
+    frames are waiting further frames are dropped and counted rather than
+    stalling the caller, except required ones, which are always queued.
+    """
+
+    def __init__(self, stream, max_queue_size=MAX_QUEUE_SIZE, on_error=None):
+        self.stream = stream
+        self.on_error = on_error
+        self.max_queue_size = max_queue_size
+        self.queue = queue.Queue()
+        self.closed = False
+        self.messages_written = 0
+        self.bytes_written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.write_time = 0.0
+        self.max_write_time = 0.0
+        self.queued_time = 0.0
+        self.thread = threading.Thread(target=self.run, name='dxmate-lsp-writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def send(self, *chunks, required=False):
+        """Queues a frame given as one or more byte strings; False if it was dropped"""
+        if self.closed:
+            return False
+        if not required and self.queue.qsize() >= self.max_queue_size:
+            self.dropped += 1
+            return False
+        self.queue.put_nowait((time.time(), chunks))
+        return True
+
+    def close(self):
+        """Stops the thread once everything queued so far is written"""
+        self.closed = True
+        self.queue.put_nowait(None)
+
+    def run(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            size = self.frame_size(item)
+            while size < MAX_COALESCE_BYTES:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+                size += self.frame_size(item)
+            if not self.write(batch, size):
+                return
+
+    def frame_size(self, item):
+        return sum(len(chunk) for chunk in item[1])
+
+    def write(self, batch, size):
+        start = time.time()
+        try:
+            for queued, chunks in batch:
+                for chunk in chunks:
+                    self.stream.write(chunk)
+            self.stream.flush()
+        except (IOError, OSError, ValueError) as e:
+            self.closed = True
+            if self.on_error:
+                self.on_error(e)
+            return False
+        end = time.time()
+        elapsed = end - start
+        self.write_time += elapsed
+        self.max_write_time = max(self.max_write_time, elapsed)
+        self.queued_time += sum(end - queued for queued, chunks in batch)
+        self.messages_written += len(batch)
+        self.bytes_written += size
+        self.flushes += 1
+        return True
+
+    def stats(self):
+        written = self.messages_written or 1
+        flushes = self.flushes or 1
+        return {
+            "queue_depth": self.queue.qsize(),
+            "messages": self.messages_written,
+            "bytes": self.bytes_written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "avg_write_ms": self.write_time / flushes * 1000,
+            "max_write_ms": self.max_write_time * 1000,
+            "avg_latency_ms": self.queued_time / written * 1000
+        }
+
+
+class ProcessReader(object):
+    """Reads a process' stdout and stderr on a single thread.
+
+    Both pipes are multiplexed with selectors; the process is considered
+    gone when stdout reaches EOF, so there is no polling. stdout is cut into
+    frames by a FrameReader and handed to on_message, while stderr lines
+    are kept in a bounded ring buffer instead of being printed.
+
+    Where pipes can't be used with selectors (Windows, or Pythons without
+    the module) each pipe gets its own blocking thread instead. stdout may
+    also be a connected socket, see SocketProcess.
+    """
+
+    def __init__(self, stdout, stderr, on_message, on_exit, stderr_lines=MAX_STDERR_LINES):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.on_message = on_message
+        self.on_exit = on_exit
+        self.frames = FrameReader()
+        self.stderr_log = collections.deque(maxlen=stderr_lines)
+        self.stderr_partial = b""
+        self.stderr_bytes = 0
+        self.threads = []
+
+    @property
+    def bytes_read(self):
+        return self.frames.bytes_read
+
+    def start(self):
+        if selectors and (os.name != "nt" or isinstance(self.stdout, socket.socket)):
+            targets = [self.run_selector]
+        else:
+            targets = [self.run_stdout]
+            if self.stderr:
+                targets.append(self.run_stderr)
+        for target in targets:
+            thread = threading.Thread(target=target, name='dxmate-lsp-reader')
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def run_selector(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.stdout, selectors.EVENT_READ, self.on_stdout)
+        if self.stderr:
+            selector.register(self.stderr, selectors.EVENT_READ, self.on_stderr)
+        try:
+            while selector.get_map():
+                for key, events in selector.select():
+                    data = self.read_chunk(key.fileobj)
+                    if data:
+                        key.data(data)
+                    else:
+                        selector.unregister(key.fileobj)
+                        if key.fileobj is self.stdout:
+                            return
+        except (IOError, OSError, ValueError):
+            pass
+        finally:
+            selector.close()
+            self.on_exit()
+
+    def run_stdout(self):
+        try:
+            self.run_stream(self.stdout, self.on_stdout)
+        finally:
+            self.on_exit()
+
+    def run_stderr(self):
+        self.run_stream(self.stderr, self.on_stderr)
+
+    def run_stream(self, stream, on_data):
+        try:
+            while True:
+                data = self.read_chunk(stream)
+                if not data:
+                    return
+                on_data(data)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def read_chunk(self, stream):
+        if isinstance(stream, socket.socket):
+            return stream.recv(READ_CHUNK_SIZE)
+        return os.read(stream.fileno(), READ_CHUNK_SIZE)
+
+    def on_stdout(self, data):
+        for frame in self.frames.feed(data):
+            self.on_message(frame)
+
+    def on_stderr(self, data):
+        self.stderr_bytes += len(data)
+        lines = (self.stderr_partial + data).split(b"\n")
+        self.stderr_partial = lines.pop()
+        for line in lines:
+            self.stderr_log.append(line.rstrip(b"\r").decode("UTF-8", "replace"))
+
+    def stderr_tail(self, count=None):
+        lines = list(self.stderr_log)
+        return lines[-count:] if count else lines
+
+
+class SocketProcess(object):
+    """Looks enough like a Popen for Client to talk to a server over a socket.
+
+    Used when the language server runs behind the daemon supervisor: the
+    server process isn't ours, so kill() only disconnects from it.
+    """
+
+    def __init__(self, sock, pid=None):
+        self.socket = sock
+        self.pid = pid
+        self.stdin = sock.makefile("wb")
+        self.stdout = sock
+        self.stderr = None
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            self.returncode = 0
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.socket.close()
+
+    terminate = kill
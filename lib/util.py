@@ -7,12 +7,14 @@ from urllib.request import pathname2url
 from urllib.request import url2pathname
 from collections import OrderedDict
 import json
+from .framing import encode_payload
 
 class Util(object):
     def __init__(self):
         self.settings = None
         self.sublime_version = int(float(sublime.version()))
         self.DXWindows = {}
+        self.dx_folders = {}
 
     def load_settings(self):
         return sublime.load_settings('dxmate.sublime-settings')
@@ -37,7 +39,15 @@ class Util(object):
 
 
     def get_dx_folder_for_window(self, window):
-        open_folders = window.folders()
+        open_folders = tuple(window.folders())
+        if open_folders not in self.dx_folders:
+            self.dx_folders[open_folders] = self.find_dx_folder(open_folders)
+        return self.dx_folders[open_folders]
+
+    def find_dx_folder(self, open_folders):
+        for folder in open_folders:
+            if os.path.isfile(os.path.join(folder, 'sfdx-project.json')):
+                return folder
         for folder in open_folders:
             for root, dirs, files in os.walk(folder, topdown=False):
                 for name in files:
@@ -125,11 +135,8 @@ class Util(object):
 
 
     def format_request(self,payload: 'Dict[str, Any]'):
-        """Converts the request into json and adds the Content-Length header"""
-        content = json.dumps(payload, sort_keys=False)
-        content_length = len(content)
-        result = "Content-Length: {}\r\n\r\n{}".format(content_length, content)
-        return result
+        """Converts the request into (header, body) bytes ready to be written"""
+        return encode_payload(payload)
 
 
 util = Util()
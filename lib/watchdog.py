@@ -0,0 +1,88 @@
+"""
+Samples the language server's memory and CPU use from /proc.
+
+Only Linux has /proc/<pid>/stat; elsewhere sample() returns None and
+the watchdog stays idle.
+"""
+
+import os
+import time
+from collections import deque
+
+try:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+    PAGE_SIZE = 4096
+
+MB = 1024 * 1024
+
+
+def read_proc_stat(pid):
+    """Returns (rss bytes, cpu seconds used) of a process, or None"""
+    try:
+        with open('/proc/{}/stat'.format(pid), 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    # The command name is in parentheses and may contain spaces
+    fields = data[data.rindex(b')') + 2:].split()
+    utime, stime, rss_pages = int(fields[11]), int(fields[12]), int(fields[21])
+    return rss_pages * PAGE_SIZE, (utime + stime) / CLOCK_TICKS
+
+
+class ResourceSampler(object):
+    """Keeps the last samples of one process's RSS and CPU percentage"""
+
+    def __init__(self, pid, history=60):
+        self.pid = pid
+        self.samples = deque(maxlen=history)  # type: Deque[Tuple[float, int, float]]
+        self.peak_rss = 0
+        self.last_cpu = None  # type: Optional[Tuple[float, float]]
+
+    def sample(self):
+        """Appends and returns (time, rss bytes, cpu percent), None without /proc"""
+        stat = read_proc_stat(self.pid)
+        if stat is None:
+            return None
+        now = time.time()
+        rss, cpu_seconds = stat
+        cpu_percent = 0.0
+        if self.last_cpu and now > self.last_cpu[0]:
+            cpu_percent = 100.0 * (cpu_seconds - self.last_cpu[1]) / (now - self.last_cpu[0])
+        self.last_cpu = (now, cpu_seconds)
+        self.peak_rss = max(self.peak_rss, rss)
+        sample = (now, rss, cpu_percent)
+        self.samples.append(sample)
+        return sample
+
+    def over_limits(self, max_rss_mb=0, max_cpu_percent=0, cpu_samples=1):
+        """Returns why the process should be recycled, or None.
+
+        RSS counts as soon as one sample exceeds max_rss_mb; CPU only when
+        the last cpu_samples samples all exceed max_cpu_percent.
+        """
+        if not self.samples:
+            return None
+        rss = self.samples[-1][1]
+        if max_rss_mb and rss > max_rss_mb * MB:
+            return 'rss {:.0f}MB > {}MB'.format(rss / MB, max_rss_mb)
+        recent = list(self.samples)[-cpu_samples:]
+        if max_cpu_percent and len(recent) >= cpu_samples and \
+                all(sample[2] > max_cpu_percent for sample in recent):
+            return 'cpu > {}% for {} samples'.format(max_cpu_percent, cpu_samples)
+        return None
+
+    def stats(self):
+        if not self.samples:
+            return {'pid': self.pid, 'samples': 0}
+        cpu = [sample[2] for sample in self.samples]
+        return {
+            'pid': self.pid,
+            'samples': len(self.samples),
+            'rss_mb': self.samples[-1][1] / MB,
+            'peak_rss_mb': self.peak_rss / MB,
+            'cpu_percent': cpu[-1],
+            'avg_cpu_percent': sum(cpu) / len(cpu)
+        }
@@ -0,0 +1,38 @@
+"""
+Tests for lib/apex_index.py.
+"""
+
+import unittest
+
+import support  # noqa: F401  registers lib as dxmate_lib
+from dxmate_lib.apex_index import FLAG_STATIC, KIND_METHOD, Symbol, split_parameters
+
+
+class SplitParametersTest(unittest.TestCase):
+
+    def test_plain(self):
+        self.assertEqual(split_parameters("String a, Integer b"), ["String a", "Integer b"])
+        self.assertEqual(split_parameters(""), [])
+
+    def test_generic_types_stay_whole(self):
+        self.assertEqual(split_parameters("Map<String, List<Id>> m, Integer i"),
+                         ["Map<String, List<Id>> m", "Integer i"])
+
+
+class CompletionItemTest(unittest.TestCase):
+
+    def test_snippet_has_one_tab_stop_per_parameter(self):
+        symbol = Symbol('database', 'queryWithBinds',
+                        'static List<SObject> queryWithBinds(String queryString, '
+                        'Map<String, Object> bindMap, AccessLevel accessLevel)',
+                        '', KIND_METHOD, FLAG_STATIC)
+        self.assertEqual(symbol.completion_item()["insertText"],
+                         "queryWithBinds(${1:queryString}, ${2:bindMap}, ${3:accessLevel})")
+
+    def test_no_parameters(self):
+        symbol = Symbol('date', 'today', 'static Date today()', '', KIND_METHOD, FLAG_STATIC)
+        self.assertEqual(symbol.completion_item()["insertText"], "today()")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Tests for lib/completion_cache.py.
+"""
+
+import unittest
+
+import support  # noqa: F401  registers lib as dxmate_lib
+from dxmate_lib.completion_cache import CompletionCache, matches
+
+ACCOUNT_KEY = ("/project/classes/A.cls", 3, "        acc.", ".")
+OPPORTUNITY_KEY = ("/project/classes/A.cls", 3, "        opp.", ".")
+
+
+def labels(items):
+    return [item["label"] for item in items]
+
+
+def completion_list(*names, incomplete=False):
+    return {"isIncomplete": incomplete, "items": [{"label": name} for name in names]}
+
+
+class MatchesTest(unittest.TestCase):
+
+    def test_subsequence(self):
+        self.assertTrue(matches("gD", "getDescribe"))
+        self.assertTrue(matches("", "anything"))
+        self.assertFalse(matches("dg", "getDescribe"))
+
+
+class CompletionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = CompletionCache(size=2, ttl=30)
+
+    def test_narrows_while_typing(self):
+        self.cache.put(ACCOUNT_KEY, "", completion_list("Name", "NumberOfEmployees", "Id"))
+        self.assertEqual(labels(self.cache.get(ACCOUNT_KEY, "N")), ["Name", "NumberOfEmployees"])
+        self.assertEqual(labels(self.cache.get(ACCOUNT_KEY, "Nu")), ["NumberOfEmployees"])
+        # Deleting back to a shorter prefix widens the list again
+        self.assertEqual(labels(self.cache.get(ACCOUNT_KEY, "")), ["Name", "NumberOfEmployees", "Id"])
+
+    def test_expression_before_the_word_is_part_of_the_key(self):
+        self.cache.put(ACCOUNT_KEY, "", completion_list("Name"))
+        self.assertIsNone(self.cache.get(OPPORTUNITY_KEY, ""))
+        self.assertIsNone(self.cache.get(OPPORTUNITY_KEY, "N"))
+
+    def test_prefix_that_does_not_extend_the_cached_one(self):
+        self.cache.put(ACCOUNT_KEY, "Na", completion_list("Name"))
+        self.assertIsNone(self.cache.get(ACCOUNT_KEY, "N"))
+
+    def test_incomplete_lists_only_serve_their_prefix(self):
+        self.cache.put(ACCOUNT_KEY, "N", completion_list("Name", incomplete=True))
+        self.assertEqual(labels(self.cache.get(ACCOUNT_KEY, "N")), ["Name"])
+        self.assertIsNone(self.cache.get(ACCOUNT_KEY, "Na"))
+
+    def test_expired_entries_are_dropped(self):
+        self.cache.put(ACCOUNT_KEY, "", completion_list("Name"))
+        self.cache.entries[ACCOUNT_KEY].created -= 31
+        self.assertIsNone(self.cache.get(ACCOUNT_KEY, ""))
+        self.assertNotIn(ACCOUNT_KEY, self.cache.entries)
+
+    def test_least_recently_used_is_evicted(self):
+        third = ("/project/classes/B.cls", 0, "", "")
+        self.cache.put(ACCOUNT_KEY, "", completion_list("Name"))
+        self.cache.put(OPPORTUNITY_KEY, "", completion_list("StageName"))
+        self.cache.get(ACCOUNT_KEY, "")
+        self.cache.put(third, "", [{"label": "x"}])
+        self.assertIsNotNone(self.cache.get(ACCOUNT_KEY, ""))
+        self.assertIsNone(self.cache.get(OPPORTUNITY_KEY, ""))
+
+    def test_clear_and_stats(self):
+        self.cache.put(ACCOUNT_KEY, "", completion_list("Name"))
+        self.cache.get(ACCOUNT_KEY, "")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(ACCOUNT_KEY, ""))
+        stats = self.cache.stats()
+        self.assertEqual((stats["lookups"], stats["hits"], stats["entries"]), (2, 1, 0))
+
+    def test_size_zero_turns_the_cache_off(self):
+        self.cache.configure(size=0)
+        self.cache.put(ACCOUNT_KEY, "", completion_list("Name"))
+        self.assertIsNone(self.cache.get(ACCOUNT_KEY, ""))
+
+
+if __name__ == '__main__':
+    unittest.main()
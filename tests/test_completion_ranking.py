@@ -0,0 +1,56 @@
+"""
+Tests for lib/completion_ranking.py.
+"""
+
+import unittest
+
+import support  # noqa: F401  registers lib as dxmate_lib
+from dxmate_lib.completion_ranking import Memo, fuzzy_score, rank
+
+
+class RankTest(unittest.TestCase):
+
+    def test_prefix_matches_first(self):
+        items = ["setName", "getName", "getNameSpace", "gN"]
+        self.assertEqual(rank(items, "getN")[:2], ["getName", "getNameSpace"])
+
+    def test_case_matching_prefix_wins(self):
+        self.assertEqual(rank(["Name", "name"], "na"), ["name", "Name"])
+
+    def test_word_starts_beat_scattered_letters(self):
+        self.assertEqual(rank(["guided", "getDescribe"], "gd"), ["getDescribe", "guided"])
+
+    def test_non_matches_are_dropped(self):
+        self.assertEqual(rank(["Id", "Name"], "xyz"), [])
+        self.assertIsNone(fuzzy_score("xyz", "Name"))
+
+    def test_limit_keeps_the_best(self):
+        items = ["a{}".format(n) for n in range(100)] + ["abc"]
+        self.assertEqual(rank(items, "abc", limit=1), ["abc"])
+        self.assertEqual(len(rank(items, "a", limit=10)), 10)
+
+    def test_ties_keep_the_server_order(self):
+        self.assertEqual(rank(["Idx", "Idy", "Idz"], "Id"), ["Idx", "Idy", "Idz"])
+
+    def test_without_prefix_the_server_order_is_kept(self):
+        items = ["b", "a", "c"]
+        self.assertEqual(rank(items, ""), items)
+        self.assertEqual(rank(items, "", limit=2), ["b", "a"])
+
+    def test_key(self):
+        items = [{"label": "Id"}, {"label": "Name"}]
+        self.assertEqual(rank(items, "na", key=lambda item: item["label"]), [{"label": "Name"}])
+
+
+class MemoTest(unittest.TestCase):
+
+    def test_calls_once_per_key(self):
+        calls = []
+        memo = Memo(lambda item: calls.append(item) or item.upper(), key=lambda item: item, size=2)
+        self.assertEqual([memo("a"), memo("a"), memo("b")], ["A", "A", "B"])
+        self.assertEqual(calls, ["a", "b"])
+        self.assertEqual((memo.hits, memo.misses), (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
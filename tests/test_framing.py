@@ -0,0 +1,98 @@
+"""
+Tests for frame splitting and peeking in lib/framing.py.
+"""
+
+import json
+import unittest
+
+import support  # noqa: F401  registers lib as dxmate_lib
+from dxmate_lib.framing import FrameReader, encode_frame, encode_payload, peek_id, peek_method
+
+
+def frame(payload):
+    header, body = encode_payload(payload)
+    return header + body
+
+
+class FrameReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = FrameReader()
+
+    def test_single_frame(self):
+        data = frame({"id": 1, "result": None})
+        self.assertEqual(self.reader.feed(data), [data[data.index(b"{"):]])
+
+    def test_several_frames_in_one_chunk(self):
+        payloads = [{"id": n, "result": n} for n in range(3)]
+        frames = self.reader.feed(b"".join(frame(payload) for payload in payloads))
+        self.assertEqual([json.loads(body.decode("UTF-8")) for body in frames], payloads)
+        self.assertEqual(self.reader.messages, 3)
+
+    def test_partial_header_and_body(self):
+        data = frame({"method": "textDocument/publishDiagnostics", "params": {"diagnostics": []}})
+        frames = []
+        for split in (5, 30):
+            frames += self.reader.feed(data[:split])
+            data = data[split:]
+        self.assertEqual(frames, [])
+        frames = self.reader.feed(data)
+        self.assertEqual(json.loads(frames[0].decode("UTF-8"))["method"], "textDocument/publishDiagnostics")
+
+    def test_byte_at_a_time(self):
+        data = frame({"id": 1, "result": "x"}) + frame({"id": 2, "result": "y"})
+        frames = []
+        for index in range(len(data)):
+            frames += self.reader.feed(data[index:index + 1])
+        self.assertEqual([peek_id(body) for body in frames], [1, 2])
+        self.assertEqual(len(self.reader.buffer), 0)
+
+    def test_frame_and_a_half(self):
+        first = frame({"id": 1, "result": None})
+        second = frame({"id": 2, "result": None})
+        self.assertEqual(len(self.reader.feed(first + second[:10])), 1)
+        self.assertEqual([peek_id(body) for body in self.reader.feed(second[10:])], [2])
+
+    def test_content_length_counts_bytes(self):
+        body = '{"id":1,"result":"Café ☕"}'.encode("UTF-8")
+        self.assertEqual(self.reader.feed(encode_frame(body) + encode_frame(b'{"id":2}')),
+                         [body, b'{"id":2}'])
+
+    def test_other_headers(self):
+        data = b"Content-Type: application/vscode-jsonrpc\r\ncontent-length: 8\r\n\r\n{\"id\":1}"
+        self.assertEqual(self.reader.feed(data), [b'{"id":1}'])
+
+
+class PeekTest(unittest.TestCase):
+
+    def test_response(self):
+        body = b'{"jsonrpc":"2.0","id":42,"result":{"method":"x","id":7}}'
+        self.assertEqual(peek_id(body), 42)
+        self.assertIsNone(peek_method(body))
+
+    def test_string_id(self):
+        self.assertEqual(peek_id(b'{"jsonrpc":"2.0","id":"17","result":null}'), 17)
+
+    def test_notification(self):
+        body = b'{"jsonrpc":"2.0","method":"window/logMessage","params":{"type":4,"message":"m"}}'
+        self.assertEqual(peek_method(body), "window/logMessage")
+        self.assertIsNone(peek_id(body))
+
+    def test_server_request(self):
+        body = b'{"id":3,"method":"client/registerCapability","params":{}}'
+        self.assertEqual(peek_id(body), 3)
+        self.assertEqual(peek_method(body), "client/registerCapability")
+
+    def test_nested_keys_are_ignored(self):
+        body = b'{"jsonrpc":"2.0","params":{"id":5,"method":"nested"},"method":"outer"}'
+        self.assertIsNone(peek_id(body))
+        self.assertIsNone(peek_method(body))
+
+    def test_gives_up_past_limit(self):
+        body = b'{"jsonrpc":"2.0",' + b' ' * 200 + b'"method":"late"}'
+        self.assertIsNone(peek_method(body))
+        self.assertEqual(peek_method(body, limit=len(body)), "late")
+
+
+if __name__ == '__main__':
+    unittest.main()
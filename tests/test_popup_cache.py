@@ -0,0 +1,62 @@
+"""
+Tests for lib/popup_cache.py.
+"""
+
+import unittest
+
+import support  # noqa: F401  registers lib as dxmate_lib
+from dxmate_lib.popup_cache import RenderCache
+
+
+class RenderCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = RenderCache(budget=100)
+        self.renders = []
+
+    def render(self, key, html):
+        def render_fn():
+            self.renders.append(key)
+            return html
+        return self.cache.render(key, render_fn)
+
+    def test_hit_skips_rendering(self):
+        key = ("**bold**", "Monokai")
+        self.assertEqual(self.render(key, "<b>bold</b>"), "<b>bold</b>")
+        self.assertEqual(self.render(key, "unused"), "<b>bold</b>")
+        self.assertEqual(self.renders, [key])
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_colour_scheme_is_part_of_the_key(self):
+        self.render(("text", "Monokai"), "a")
+        self.render(("text", "Mariana"), "b")
+        self.assertEqual(len(self.renders), 2)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        first, second, third = ("a" * 10, ""), ("b" * 10, ""), ("c" * 10, "")
+        self.render(first, "x" * 30)
+        self.render(second, "x" * 30)
+        self.render(first, "unused")
+        self.render(third, "x" * 30)
+        self.assertIn(first, self.cache.entries)
+        self.assertNotIn(second, self.cache.entries)
+        self.assertEqual(self.cache.used, 80)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_entries_larger_than_the_budget_are_not_kept(self):
+        self.render(("big", ""), "x" * 200)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertEqual(self.cache.used, 0)
+
+    def test_shrinking_the_budget_evicts(self):
+        self.render(("a", ""), "x" * 40)
+        self.render(("b", ""), "x" * 40)
+        self.cache.configure(50)
+        self.assertEqual(list(self.cache.entries), [("b", "")])
+        self.cache.configure(0)
+        self.assertEqual(self.cache.used, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
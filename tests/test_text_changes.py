@@ -0,0 +1,65 @@
+"""
+Tests for lib/text_changes.py, which does not need Sublime.
+
+    python3 -m unittest discover tests
+"""
+
+import unittest
+
+import support  # noqa: F401  registers lib as dxmate_lib
+from dxmate_lib.text_changes import ChangeTracker, content_change
+
+
+def insert(line, character, text):
+    return content_change(line, character, line, character, text)
+
+
+class ChangeTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = ChangeTracker()
+
+    def test_nothing_synced_yet(self):
+        self.tracker.record(1, 1, [insert(0, 0, 'x')])
+        self.assertIsNone(self.tracker.take(1))
+
+    def test_changes_after_sync(self):
+        self.tracker.synced(1, 4)
+        self.tracker.record(1, 5, [insert(0, 0, 'x')])
+        self.tracker.record(1, 6, [insert(0, 1, 'y')])
+        self.assertEqual(self.tracker.take(1), [insert(0, 0, 'xy')])
+        self.assertEqual(self.tracker.take(1), [])
+
+    def test_changes_recorded_before_sync_are_dropped(self):
+        self.tracker.synced(1, 4)
+        self.tracker.record(1, 5, [insert(0, 0, 'x')])
+        self.tracker.record(1, 6, [insert(0, 1, 'y')])
+        self.tracker.synced(1, 5)
+        self.assertEqual(self.tracker.take(1), [insert(0, 1, 'y')])
+
+    def test_changes_reported_after_sync_are_dropped(self):
+        # The text is read on the async thread before on_text_changed for
+        # the same edit arrives on the main thread
+        self.tracker.synced(1, 4)
+        self.tracker.synced(1, 5)
+        self.tracker.record(1, 5, [insert(0, 0, 'x')])
+        self.assertEqual(self.tracker.take(1), [])
+        self.tracker.record(1, 6, [insert(0, 1, 'y')])
+        self.assertEqual(self.tracker.take(1), [insert(0, 1, 'y')])
+
+    def test_changes_reported_after_take_are_dropped(self):
+        self.tracker.synced(1, 4)
+        self.tracker.record(1, 6, [insert(0, 0, 'x')])
+        self.assertEqual(self.tracker.take(1), [insert(0, 0, 'x')])
+        self.tracker.record(1, 5, [insert(0, 0, 'y')])
+        self.assertEqual(self.tracker.take(1), [])
+
+    def test_uncertain_sync_falls_back_to_full_text(self):
+        self.tracker.synced(1, 4)
+        self.tracker.synced(1, None)
+        self.tracker.record(1, 5, [insert(0, 0, 'x')])
+        self.assertIsNone(self.tracker.take(1))
+
+
+if __name__ == '__main__':
+    unittest.main()